@@ -0,0 +1,129 @@
+# analytics.py - Student dashboard numbers from the student_stats rollup (one row per grade/country/premium group)
+import os, logging, threading
+from collections import Counter
+from sqlalchemy import select, update, delete, insert, func, inspect, tuple_
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects import sqlite, postgresql
+from models import Student, StudentStats
+from database import SINGLE_WRITER, write_lock
+
+STATS_REBUILD_INTERVAL = float(os.getenv("STUDENT_STATS_REBUILD_INTERVAL", "3600"))   # seconds, 0 = never
+
+logger = logging.getLogger("career")
+
+UPSERT_INSERTS = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+
+
+def group_of(grade, country, premium) -> tuple:
+    return (grade or "", country or "", bool(premium))
+
+def student_group_columns():
+    """group_of() in SQL"""
+    return func.coalesce(Student.grade, ""), func.coalesce(Student.country, ""), func.coalesce(Student.premium, False)
+
+
+# Incremental updates, in the same transaction as the write they count
+def count_new_students(db: Session, students):
+    """+1 per student in its group. `students` are dicts or objects with grade / country / premium."""
+    groups = Counter(
+        group_of(*(s.get(k) if isinstance(s, dict) else getattr(s, k) for k in ("grade", "country", "premium")))
+        for s in students
+    )
+    if not groups:
+        return
+    rows = [{"grade": g, "country": c, "premium": p, "students": n, "career_tests_taken": 0} for (g, c, p), n in groups.items()]
+
+    make_insert = UPSERT_INSERTS.get(db.get_bind().dialect.name)
+    if make_insert is None:
+        db.flush()
+        rebuild_student_stats(db)       # no upsert on this database - recount instead
+        return
+    statement = make_insert(StudentStats)
+    db.execute(
+        statement.on_conflict_do_update(
+            index_elements=["grade", "country", "premium"],
+            set_={"students": StudentStats.students + statement.excluded.students},
+        ),
+        rows
+    )
+
+
+def count_test_taken(db: Session, student_id: int):
+    """+1 career test for the student's group - one UPDATE, the group is looked up inside it."""
+    db.execute(
+        update(StudentStats)
+        .where(tuple_(StudentStats.grade, StudentStats.country, StudentStats.premium).in_(
+            select(*student_group_columns()).where(Student.id == student_id)
+        ))
+        .values(career_tests_taken=StudentStats.career_tests_taken + 1)
+        .execution_options(synchronize_session=False)
+    )
+
+
+# Full rebuild: recount everything with one GROUP BY. Runs from the migration and periodically
+# (STUDENT_STATS_REBUILD_INTERVAL) to correct any drift, e.g. rows edited by hand.
+def rebuild_student_stats(db):
+    grade, country, premium = student_group_columns()
+    db.execute(delete(StudentStats))
+    db.execute(
+        insert(StudentStats).from_select(
+            ["grade", "country", "premium", "students", "career_tests_taken"],
+            select(grade, country, premium, func.count(Student.id), func.coalesce(func.sum(Student.career_test_count), 0))
+            .group_by(grade, country, premium)
+        )
+    )
+
+
+def migrate_student_stats(engine: Engine):
+    if not inspect(engine).has_table("students"):
+        return
+    StudentStats.__table__.create(bind=engine, checkfirst=True)
+    with engine.begin() as conn:
+        rebuild_student_stats(conn)
+
+
+def start_stats_rebuilder(session_factory) -> threading.Event:
+    """Background thread rebuilding the rollup every STATS_REBUILD_INTERVAL seconds; set the returned event to stop it."""
+    stop = threading.Event()
+
+    def run():
+        while not stop.wait(STATS_REBUILD_INTERVAL):
+            if SINGLE_WRITER:
+                write_lock.acquire()
+            db = session_factory()
+            try:
+                rebuild_student_stats(db)
+                db.commit()
+            except Exception:
+                logger.exception("Student stats rebuild failed")
+            finally:
+                db.close()
+                if SINGLE_WRITER:
+                    write_lock.release()
+
+    if STATS_REBUILD_INTERVAL > 0:
+        threading.Thread(target=run, name="student-stats", daemon=True).start()
+    return stop
+
+
+def get_student_stats(db: Session) -> dict:
+    """Dashboard totals and breakdowns - reads one row per group, never a student row."""
+    groups = db.execute(select(StudentStats).where(StudentStats.students > 0)).scalars().all()
+    by_grade, by_country = {}, {}
+    for g in groups:
+        for breakdown, key in ((by_grade, g.grade), (by_country, g.country)):
+            entry = breakdown.setdefault(key, {"students": 0, "career_tests_taken": 0})
+            entry["students"] += g.students
+            entry["career_tests_taken"] += g.career_tests_taken
+
+    total = sum(g.students for g in groups)
+    premium = sum(g.students for g in groups if g.premium)
+    return {
+        "students": total,
+        "premium": premium,
+        "free": total - premium,
+        "career_tests_taken": sum(g.career_tests_taken for g in groups),
+        "by_grade": dict(sorted(by_grade.items())),
+        "by_country": dict(sorted(by_country.items())),
+    }
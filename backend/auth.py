@@ -0,0 +1,179 @@
+# auth.py - Signed stateless tokens (JWT, HS256) and an in-process cache of resolved principals
+import os, time, json, hmac, hashlib, base64, secrets, threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+from fastapi import Header, HTTPException
+from sqlalchemy.orm import Session
+from models import Student, Admin
+from database import SessionLocal
+
+TOKEN_TTL = int(os.getenv("AUTH_TOKEN_TTL", str(12 * 3600)))          # seconds
+PRINCIPAL_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
+PRINCIPAL_CACHE_TTL = int(os.getenv("AUTH_CACHE_TTL", "300"))          # seconds
+# AUTH_REQUIRED=0 keeps the admin routes open while the frontend switches over to sending tokens
+AUTH_REQUIRED = os.getenv("AUTH_REQUIRED", "0") == "1"
+KEY_FILE = os.getenv("AUTH_KEY_FILE", ".auth_key")
+
+
+def load_secret_key() -> bytes:
+    """AUTH_SECRET_KEY, or a random key kept in a local file so every worker signs with the same one."""
+    if os.getenv("AUTH_SECRET_KEY"):
+        return os.getenv("AUTH_SECRET_KEY").encode()
+    try:
+        fd = os.open(KEY_FILE, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, "w") as f:
+            f.write(secrets.token_hex(32))
+    except FileExistsError:
+        pass
+    with open(KEY_FILE) as f:
+        return f.read().strip().encode()
+
+SECRET_KEY = load_secret_key()
+
+
+def _b64encode(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+_HEADER = _b64encode(json.dumps({"alg": "HS256", "typ": "JWT"}).encode())
+
+def _sign(message: str) -> str:
+    return _b64encode(hmac.new(SECRET_KEY, message.encode(), hashlib.sha256).digest())
+
+
+def create_token(user_id: int, role: str) -> str:
+    now = int(time.time())
+    payload = _b64encode(json.dumps({"sub": str(user_id), "role": role, "iat": now, "exp": now + TOKEN_TTL}).encode())
+    return f"{_HEADER}.{payload}.{_sign(_HEADER + '.' + payload)}"
+
+def decode_token(token: str) -> dict:
+    """Check signature and expiry - pure CPU, no database."""
+    try:
+        header, payload, signature = token.split(".")
+        if not hmac.compare_digest(signature, _sign(header + "." + payload)):
+            raise ValueError("bad signature")
+        claims = json.loads(_b64decode(payload))
+        int(claims["sub"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=401, detail="Invalid token")
+    if claims.get("exp", 0) < time.time():
+        raise HTTPException(status_code=401, detail="Token expired")
+    return claims
+
+
+
+
+
+@dataclass(frozen=True)
+class Principal:
+    id: int
+    role: str
+    premium: bool = False
+
+
+# LRU + TTL cache of principals, keyed by (role, id)
+class PrincipalCache:
+    def __init__(self, maxsize: int, ttl: int):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, role: str, user_id: int) -> Optional[Principal]:
+        with self.lock:
+            entry = self.entries.get((role, user_id))
+            if entry and entry[1] > time.monotonic():
+                self.entries.move_to_end((role, user_id))
+                self.hits += 1
+                return entry[0]
+            if entry:
+                del self.entries[(role, user_id)]
+            self.misses += 1
+            return None
+
+    def put(self, principal: Principal):
+        with self.lock:
+            self.entries[(principal.role, principal.id)] = (principal, time.monotonic() + self.ttl)
+            self.entries.move_to_end((principal.role, principal.id))
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, role: str, user_id: int):
+        with self.lock:
+            self.entries.pop((role, user_id), None)
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self.entries), "maxsize": self.maxsize}
+
+principal_cache = PrincipalCache(PRINCIPAL_CACHE_SIZE, PRINCIPAL_CACHE_TTL)
+
+
+def invalidate_principal(role: str, user_id: int):
+    """Call after anything that changes a student / admin row, so the next request re-reads it."""
+    principal_cache.invalidate(role, user_id)
+
+
+def load_principal(db: Session, role: str, user_id: int) -> Optional[Principal]:
+    if role == "student":
+        row = db.query(Student.id, Student.premium).filter(Student.id == user_id).first()
+        return Principal(id=row.id, role="student", premium=bool(row.premium)) if row else None
+    if role == "admin":
+        row = db.query(Admin.id).filter(Admin.id == user_id).first()
+        return Principal(id=row.id, role="admin") if row else None
+    return None
+
+
+def resolve_principal(token: str, db_factory) -> Principal:
+    claims = decode_token(token)
+    role, user_id = claims.get("role"), int(claims["sub"])
+
+    principal = principal_cache.get(role, user_id)
+    if principal:
+        return principal            # cache hit - no database at all
+
+    db = db_factory()
+    try:
+        principal = load_principal(db, role, user_id)
+    finally:
+        db.close()
+    if not principal:
+        raise HTTPException(status_code=401, detail="Account no longer exists")
+    principal_cache.put(principal)
+    return principal
+
+
+def _bearer(authorization: Optional[str]) -> Optional[str]:
+    if authorization and authorization.lower().startswith("bearer "):
+        return authorization[7:].strip()
+    return None
+
+
+# Dependencies
+# The session is only opened on a cache miss, so these don't take Depends(get_db)
+def get_current_principal(authorization: Optional[str] = Header(None)) -> Principal:
+    token = _bearer(authorization)
+    if not token:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    return resolve_principal(token, SessionLocal)
+
+def get_optional_principal(authorization: Optional[str] = Header(None)) -> Optional[Principal]:
+    """The caller if a token was sent; None without one, unless AUTH_REQUIRED=1."""
+    if not _bearer(authorization):
+        if AUTH_REQUIRED:
+            raise HTTPException(status_code=401, detail="Not authenticated")
+        return None
+    return get_current_principal(authorization)
+
+def require_admin(authorization: Optional[str] = Header(None)) -> Optional[Principal]:
+    principal = get_optional_principal(authorization)
+    if principal is None:
+        return None
+    if principal.role != "admin":
+        raise HTTPException(status_code=403, detail="Admins only")
+    return principal
@@ -0,0 +1,1115 @@
+# bench.py - Local benchmark / load test for the API: seeds a throwaway SQLite database, drives every
+# endpoint through an in-process ASGI client and saves throughput, latency, SQL and memory numbers as JSON.
+#
+#   python bench.py                                   defaults, results in bench-<timestamp>.json
+#   python bench.py --students 50000 --pages 20000 --requests 1000 --concurrency 32
+#   python bench.py --only career-page,search --compare bench-old.json
+#   python bench.py --startup-workers 4               also time uvicorn --workers 4 to its first request
+#   python bench.py --single-writer                   the same sweep with DB_SINGLE_WRITER=1 (writes queue on write_lock)
+#   python bench.py --case registrations --single-writer     one focused benchmark instead of the endpoint sweep
+#                                                              (see CASES; a case that asserts exits 1 when it fails)
+#
+# Nothing touches test.db or uploads/: the database, uploads and auth key all live in a temp directory.
+import os, sys, time, json, random, string, asyncio, logging, argparse, tempfile, threading, subprocess, platform, resource
+from contextlib import asynccontextmanager
+from datetime import datetime
+
+WORDS = (
+    "career data science engineering design teaching nursing finance analyst research laboratory software "
+    "marketing management law medicine architecture biology chemistry physics statistics business creative "
+    "hospitality aviation agriculture environment psychology journalism music animation robotics security"
+).split()
+TAG_NAMES = ["Realistic", "Investigative", "Artistic", "Social", "Enterprising", "Conventional"]
+ADMIN_EMAIL, ADMIN_PASSWORD = "bench-admin@example.com", "bench-password"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the career guidance API on a throwaway database")
+    parser.add_argument("--students", type=int, default=5000)
+    parser.add_argument("--tests", type=int, default=20)
+    parser.add_argument("--questions", type=int, default=40, help="questions per test")
+    parser.add_argument("--pages", type=int, default=2000)
+    parser.add_argument("--requests", type=int, default=300, help="requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--burst", type=int, default=1000, help="concurrent requests in the one-slug burst")
+    parser.add_argument("--only", help="comma separated endpoint names")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", help="result file (default bench-<timestamp>.json)")
+    parser.add_argument("--compare", help="earlier result file to print the change against")
+    parser.add_argument("--startup-workers", type=int, default=0, help="time uvicorn --workers N to the first request")
+    parser.add_argument("--case", choices=sorted(CASES), help="run one focused benchmark instead of the endpoint sweep")
+    parser.add_argument("--single-writer", action="store_true", help="run with DB_SINGLE_WRITER=1")
+    parser.add_argument("--scrypt-n", type=int, help="password hash cost (default: the app's, 2**14)")
+    parser.add_argument("--registrations", type=int, default=10000, help="registrations case: students to register")
+    parser.add_argument("--threads", type=int, default=64, help="registrations case: client threads")
+    parser.add_argument("--images", type=int, default=1000, help="thumbnails case: images in the batch")
+    return parser.parse_args()
+
+
+# Environment first - database.py, uploads.py and auth.py read it when they are imported
+def configure_environment(workdir: str, args):
+    os.environ.update({
+        "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        "UPLOAD_DIR": os.path.join(workdir, "uploads"),
+        "AUTH_SECRET_KEY": "bench-secret",
+        "AUTH_REQUIRED": "1",               # measure the real token check on the admin routes
+        "METRICS_ENABLED": "1",
+        "METRICS_DEBUG_HEADERS": "1",       # X-Query-Count on every response
+        "RATE_LIMIT_ENABLED": "0",          # the load generator is one client
+        "WARM_CACHES": "0",
+        "STUDENT_STATS_REBUILD_INTERVAL": "0",
+        "DB_SINGLE_WRITER": "1" if args.single_writer else "0",
+    })
+    os.environ.setdefault("COMPRESS_RESPONSES", "1")     # the tuned setup; FAST_JSON=0 python bench.py ... for the baseline
+    os.environ.setdefault("FAST_JSON", "1")
+    if args.scrypt_n:
+        os.environ["SCRYPT_N"] = str(args.scrypt_n)
+
+
+def random_html(rng: random.Random) -> str:
+    """A WYSIWYG-like page: headings, paragraphs, a list, links, entities - a few KB."""
+    def sentence(n):
+        return " ".join(rng.choice(WORDS) for _ in range(n)).capitalize() + "."
+    parts = []
+    for _ in range(rng.randint(3, 6)):
+        parts.append(f"<h2>{sentence(3)}</h2>")
+        parts.append("<p>" + " ".join(sentence(rng.randint(8, 18)) for _ in range(rng.randint(2, 5))) + " &amp; more.</p>")
+    parts.append("<ul>" + "".join(f"<li><a href=\"/career-pages/{rng.choice(WORDS)}\">{sentence(4)}</a></li>" for _ in range(4)) + "</ul>")
+    return "<div class=\"career\">" + "".join(parts) + "</div>"
+
+
+def seed(args, rng: random.Random) -> dict:
+    from sqlalchemy import insert
+    from database import engine
+    from migrations import run_migrations
+    from models import Student, Admin, CareerTest, Question
+    from security import hash_password_sync
+    from crud import migrate_question_counts
+    from analytics import migrate_student_stats
+
+    started = time.perf_counter()
+    run_migrations(engine)
+    password = hash_password_sync("student-password")       # one hash for everyone, scrypt is slow on purpose
+
+    with engine.begin() as conn:
+        conn.execute(insert(Admin), [{
+            "first_name": "Bench", "last_name": "Admin", "email": ADMIN_EMAIL, "country": "INDIA",
+            "phone": "0", "password": hash_password_sync(ADMIN_PASSWORD),
+        }])
+        for start in range(0, args.students, 5000):
+            conn.execute(insert(Student), [{
+                "first_name": rng.choice(WORDS).capitalize(), "last_name": "".join(rng.choices(string.ascii_lowercase, k=7)).capitalize(),
+                "grade": str(rng.randint(8, 12)), "email": f"student{i}@example.com", "country": rng.choice(["INDIA", "UAE", "UK", "USA"]),
+                "phone": str(9000000000 + i), "password": password, "premium": rng.random() < 0.2, "career_test_count": 0,
+            } for i in range(start, min(start + 5000, args.students))])
+
+        conn.execute(insert(CareerTest), [{
+            "id": t, "name": f"Bench test {t}", "description": "Seeded by bench.py", "last_updated": datetime.utcnow(),
+        } for t in range(1, args.tests + 1)])
+        conn.execute(insert(Question), [{
+            "test_id": t, "description": f"Question {q} of test {t}", "tag": TAG_NAMES[q % len(TAG_NAMES)],
+        } for t in range(1, args.tests + 1) for q in range(args.questions)])
+
+        insert_pages(conn, rng, range(1, args.pages + 1), {})
+
+    migrate_question_counts(engine)     # derived columns, as if the rows had come in through the API
+    migrate_student_stats(engine)
+    return {"seconds": round(time.perf_counter() - started, 2)}
+
+
+def insert_pages(conn, rng: random.Random, ids, paths: dict):
+    """Pages with these ids: 70% under a random earlier page, the rest roots. `paths` maps the existing ids to their path."""
+    from sqlalchemy import insert, text
+    from models import CareerPage
+    from riasec import tags_to_mask
+    from search import strip_html
+
+    pages = []
+    for page_id in ids:
+        parent_id = rng.randint(1, page_id - 1) if page_id > 10 and rng.random() < 0.7 else None
+        paths[page_id] = (paths[parent_id] if parent_id else "/") + f"{page_id}/"
+        tags = ",".join(rng.sample("RIASEC", rng.randint(1, 3)))
+        pages.append({
+            "id": page_id, "title": f"{rng.choice(WORDS).capitalize()} {rng.choice(WORDS)} {page_id}", "slug": f"page-{page_id}",
+            "content": random_html(rng), "riasec_tags": tags, "riasec_mask": tags_to_mask(tags),
+            "parent_id": parent_id, "path": paths[page_id], "depth": paths[page_id].count("/") - 2,
+        })
+    for start in range(0, len(pages), 2000):
+        batch = pages[start:start + 2000]
+        conn.execute(insert(CareerPage), batch)
+        conn.execute(
+            text("INSERT INTO career_pages_fts(rowid, title, body) VALUES (:id, :title, :body)"),
+            [{"id": p["id"], "title": p["title"], "body": strip_html(p["content"])} for p in batch]
+        )
+
+
+# Memory: RSS sampled every 10 ms while an endpoint runs, so each one gets its own peak
+def current_rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError, AttributeError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss       # KB on Linux, bytes on macOS
+        return peak / 2 ** 20 if sys.platform == "darwin" else peak / 1024
+
+class RssSampler:
+    def __enter__(self):
+        self.peak = current_rss_mb()
+        self.stop = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self
+
+    def _run(self):
+        while not self.stop.wait(0.01):
+            self.peak = max(self.peak, current_rss_mb())
+
+    def __exit__(self, *exc):
+        self.stop.set()
+        self.thread.join()
+        self.peak = max(self.peak, current_rss_mb())
+
+
+def percentile(sorted_values: list, p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(round(p / 100 * (len(sorted_values) - 1))))]
+
+
+async def run_endpoint(client, make_request, total: int, concurrency: int) -> dict:
+    latencies, statuses, queries = [], {}, []
+    counter = iter(range(total))
+
+    async def worker():
+        for i in counter:
+            method, url, kwargs = make_request(i)
+            started = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            await response.aread()
+            latencies.append(time.perf_counter() - started)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            if "x-query-count" in response.headers:
+                queries.append(int(response.headers["x-query-count"]))
+
+    with RssSampler() as rss:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        wall = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": total,
+        "statuses": {str(k): v for k, v in sorted(statuses.items())},
+        "throughput_rps": round(total / wall, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "max_ms": round(latencies[-1] * 1000, 2),
+        "sql_queries_per_request": round(sum(queries) / len(queries), 2) if queries else None,
+        "sql_queries_max": max(queries) if queries else None,
+        "sql_queries_total": sum(queries),
+        "peak_rss_mb": round(rss.peak, 1),
+    }
+
+
+def endpoint_scenarios(args, rng: random.Random, admin: dict) -> dict:
+    """name -> make_request(i) returning (method, url, httpx kwargs)"""
+    def get(url_of, headers=None):
+        return lambda i: ("GET", url_of(i), {"headers": headers or {}})
+
+    slug = lambda i: f"page-{rng.randint(1, args.pages)}"
+    test_id = lambda i: rng.randint(1, args.tests)
+
+    def submit(i):
+        from auth import create_token
+        t = test_id(i)
+        first = (t - 1) * args.questions + 1        # questions were seeded in test order
+        answers = {q: rng.randint(0, 4) for q in range(first, first + args.questions)}
+        student = {"Authorization": f"Bearer {create_token(rng.randint(1, args.students), 'student')}"}
+        return "POST", f"/tests/{t}/submit", {"json": {"answers": answers}, "headers": student}
+
+    def create_test(i):
+        questions = [{"description": f"Q{q}", "tag": TAG_NAMES[q % 6]} for q in range(args.questions)]
+        body = {"name": f"Created {i} {time.time_ns()}", "description": "bench", "questions": questions}
+        return "POST", "/admin/tests/create", {"json": body, "headers": admin}
+
+    def update_test(i):
+        # the seeded questions with one description edited - the usual "fix a typo" save
+        t = test_id(i)
+        first = (t - 1) * args.questions + 1
+        questions = [{"id": q, "description": f"Question {q - first} of test {t}", "tag": TAG_NAMES[(q - first) % 6]}
+                     for q in range(first, first + args.questions)]
+        questions[i % args.questions]["description"] += f" (edit {i})"
+        body = {"name": f"Bench test {t}", "description": "Seeded by bench.py", "questions": questions}
+        return "PUT", f"/admin/tests/{t}/update", {"json": body, "headers": admin}
+
+    # Imports: small files like a school's weekly upload. Passwords come pre-hashed so the sweep
+    # measures the import path, not scrypt (the login case covers hashing)
+    from security import hash_password_sync
+    hashed = hash_password_sync("import-password")
+
+    def import_students(i):
+        rows = "".join(json.dumps({
+            "first_name": "Imported", "last_name": str(n), "grade": "9", "email": f"import{i}-{n}-{time.time_ns()}@example.com",
+            "country": "UK", "phone": str(n), "password": hashed,
+        }) + "\n" for n in range(20))
+        return "POST", "/admin/import/students", {"files": {"file": ("students.jsonl", rows.encode())}, "headers": admin}
+
+    def import_tests(i):
+        questions = [{"description": f"Q{q}", "tag": TAG_NAMES[q % 6]} for q in range(args.questions)]
+        rows = json.dumps({"name": f"Imported {i} {time.time_ns()}", "description": "bench", "questions": questions}) + "\n"
+        return "POST", "/admin/import/tests", {"files": {"file": ("tests.jsonl", rows.encode())}, "headers": admin}
+
+    # Career page writes with a thumbnail; updates send the page's current parent, as the edit form
+    # does - leaving parent_id out would move the page (and its subtree) to the root
+    from sqlalchemy import select
+    from database import engine
+    from models import CareerPage
+    with engine.connect() as conn:
+        parents = dict(conn.execute(select(CareerPage.id, CareerPage.parent_id).where(CareerPage.id <= args.pages)).all())
+    thumbnail = photo(rng, 800, 600)
+
+    def create_page(i):
+        unique = f"{i}-{time.time_ns()}"       # titles and slugs are both unique
+        form = {"title": f"Created page {unique}", "slug": f"created-{unique}", "content": random_html(rng), "riasec_tags": "R,I"}
+        return "POST", "/career-pages/upload", {"data": form, "files": {"thumbnail": ("photo.jpg", thumbnail, "image/jpeg")}}
+
+    def update_page(i):
+        page_id = rng.randint(1, args.pages)
+        form = {"title": f"Updated page {page_id}", "content": random_html(rng), "riasec_tags": "S,E"}
+        if parents[page_id] is not None:
+            form["parent_id"] = str(parents[page_id])
+        files = {"thumbnail": ("photo.jpg", thumbnail, "image/jpeg")}
+        return "PUT", f"/career-pages/page-{page_id}/update", {"data": form, "files": files}
+
+    return {
+        "homepage": get(lambda i: "/homepage"),
+        "login": lambda i: ("POST", "/login", {"json": {"email": f"student{rng.randint(0, args.students - 1)}@example.com", "password": "student-password"}}),
+        "register": lambda i: ("POST", "/register", {"json": {
+            "first_name": "New", "last_name": "Student", "grade": "10", "email": f"new{i}-{time.time_ns()}@example.com",
+            "country": "INDIA", "phone": "1", "password": "new-password",
+        }}),
+        "admin-students": get(lambda i: "/admin/students?limit=50", admin),
+        "admin-students-search": get(lambda i: f"/admin/students?search={rng.choice(WORDS)[:4]}&sort_by=last_name", admin),
+        "admin-students-stats": get(lambda i: "/admin/students/stats", admin),
+        "admin-tests": get(lambda i: "/admin/tests", admin),
+        "admin-tests-summary": get(lambda i: "/admin/tests?fields=summary", admin),
+        "admin-tests-stats": get(lambda i: "/admin/tests/stats", admin),
+        "admin-test": get(lambda i: f"/admin/tests/{test_id(i)}", admin),
+        "admin-test-create": create_test,
+        "admin-test-update": update_test,
+        "admin-test-duplicate": lambda i: ("POST", f"/admin/tests/{test_id(i)}/duplicate", {"headers": admin}),
+        "admin-test-rescore": lambda i: ("POST", f"/admin/tests/{test_id(i)}/rescore", {"headers": admin}),
+        "import-students": import_students,
+        "import-tests": import_tests,
+        "admin-profile": get(lambda i: "/admin/1", admin),
+        "admin-profile-update": lambda i: ("PUT", "/admin/1", {"json": {"phone": str(i)}, "headers": admin}),
+        "test-submit": submit,
+        "career-pages": get(lambda i: "/career-pages"),
+        "career-pages-summary": get(lambda i: "/career-pages?fields=summary&limit=100"),
+        "career-page": get(lambda i: f"/career-pages/{slug(i)}"),
+        "career-page-search": get(lambda i: f"/career-pages/search?q={rng.choice(WORDS)}+{rng.choice(WORDS)[:3]}"),
+        "career-page-recommend": get(lambda i: "/career-pages/recommend?profile=" + ",".join(f"{c}:{rng.random():.2f}" for c in "RIASEC")),
+        "career-page-tree": get(lambda i: "/career-pages/tree"),
+        "career-page-ancestors": get(lambda i: f"/career-pages/{slug(i)}/ancestors"),
+        "career-page-create": create_page,
+        "career-page-update": update_page,
+        "export-students": get(lambda i: "/admin/export/students?format=jsonl", admin),
+    }
+
+
+async def one_slug_burst(client, main, burst: int) -> dict:
+    """`burst` concurrent requests for one page right after it left the cache - single-flight should make it one query."""
+    main.career_page_cache.invalidate(("slug", "page-1"))
+    shared_before = main.career_page_cache.flight.shared
+    result = await run_endpoint(client, lambda i: ("GET", "/career-pages/page-1", {}), burst, burst)
+    result["coalesced"] = main.career_page_cache.flight.shared - shared_before
+    return result
+
+
+@asynccontextmanager
+async def bench_client(base_url: str = None):
+    """(client, admin auth headers) - in-process through ASGI, or over HTTP to base_url."""
+    import httpx
+    import main
+
+    transport = httpx.ASGITransport(app=main.app) if base_url is None else None
+    async with httpx.AsyncClient(transport=transport, base_url=base_url or "http://bench", timeout=120) as client:
+        login = await client.post("/login", json={"email": ADMIN_EMAIL, "password": ADMIN_PASSWORD})
+        yield client, {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+
+async def run_all(args, rng: random.Random, only) -> dict:
+    import main
+
+    async with bench_client() as (client, admin):
+        results = {}
+        for name, make_request in endpoint_scenarios(args, rng, admin).items():
+            if only and name not in only:
+                continue
+            await run_endpoint(client, make_request, min(10, args.requests), 1)      # warm-up, not recorded
+            results[name] = await run_endpoint(client, make_request, args.requests, args.concurrency)
+            print_row(name, results[name])
+
+        if not only or "one-slug-burst" in only:
+            results["one-slug-burst"] = await one_slug_burst(client, main, args.burst)
+            print_row("one-slug-burst", results["one-slug-burst"])
+    return results
+
+
+# Focused benchmarks (--case NAME), each answering one question the endpoint sweep can't
+def serve_in_thread(app):
+    """Run the app under uvicorn on a free local port in this process; returns (server, thread, port, its event loop)."""
+    import socket, uvicorn
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_until_complete, args=(server.serve(),), daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError("uvicorn did not start")
+        time.sleep(0.01)
+    return server, thread, port, loop
+
+
+def case_registrations(args, rng: random.Random) -> dict:
+    """--registrations students registered from --threads client threads over real HTTP. Every one must
+    succeed: a 500 here is "database is locked" (or a stuck writer queue, which shows up as the timeout)."""
+    import http.client
+    import main
+    from sqlalchemy import select, func
+    from database import SessionLocal
+    from models import Student
+
+    server, thread, port, _ = serve_in_thread(main.app)
+    latencies, statuses, errors = [], {}, []
+    counter = iter(range(args.registrations))
+    lock = threading.Lock()
+
+    def client():
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=120)
+        for i in counter:
+            body = json.dumps({
+                "first_name": "Stress", "last_name": str(i), "grade": str(8 + i % 5), "email": f"stress{i}@example.com",
+                "country": "INDIA", "phone": str(i), "password": "stress-password",
+            })
+            started = time.perf_counter()
+            try:
+                conn.request("POST", "/register", body, {"Content-Type": "application/json"})
+                response = conn.getresponse()
+                detail = response.read()
+                status = response.status
+            except OSError as exc:
+                conn.close()
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=120)
+                status, detail = "error", str(exc).encode()
+            with lock:
+                latencies.append(time.perf_counter() - started)
+                statuses[status] = statuses.get(status, 0) + 1
+                if status != 200 and len(errors) < 5:
+                    errors.append(detail.decode(errors="replace")[:200])
+        conn.close()
+
+    try:
+        with RssSampler() as rss:
+            started = time.perf_counter()
+            clients = [threading.Thread(target=client) for _ in range(args.threads)]
+            for t in clients:
+                t.start()
+            for t in clients:
+                t.join()
+            wall = time.perf_counter() - started
+    finally:
+        server.should_exit = True
+        thread.join()
+
+    with SessionLocal() as db:
+        stored = db.scalar(select(func.count(Student.id)).where(Student.email.like("stress%")))
+    latencies.sort()
+    result = {
+        "registrations": args.registrations,
+        "threads": args.threads,
+        "single_writer": args.single_writer,
+        "statuses": {str(k): v for k, v in sorted(statuses.items(), key=str)},
+        "stored": stored,
+        "first_errors": errors,
+        "throughput_rps": round(args.registrations / wall, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "max_ms": round(latencies[-1] * 1000, 2),
+        "peak_rss_mb": round(rss.peak, 1),
+    }
+    print(f"{args.registrations} registrations from {args.threads} threads (single writer {'on' if args.single_writer else 'off'}): "
+          f"{result['throughput_rps']} rps, p50 {result['p50_ms']} ms, p99 {result['p99_ms']} ms, "
+          f"statuses {result['statuses']}, {stored} stored")
+    for error in errors:
+        print("  error:", error)
+    return result
+
+
+TEST_LEVELS = (10, 100, 1000)
+
+def top_up_tests(total: int, questions: int) -> int:
+    """Add seeded-style tests until there are `total`; returns how many there are."""
+    from sqlalchemy import select, func, insert
+    from database import engine
+    from models import CareerTest, Question
+    from crud import migrate_question_counts
+
+    with engine.begin() as conn:
+        have = conn.scalar(select(func.coalesce(func.max(CareerTest.id), 0)))
+        new_ids = range(have + 1, total + 1)
+        if new_ids:
+            conn.execute(insert(CareerTest), [{
+                "id": t, "name": f"Bench test {t}", "description": "Seeded by bench.py", "last_updated": datetime.utcnow(),
+            } for t in new_ids])
+            conn.execute(insert(Question), [{
+                "test_id": t, "description": f"Question {q} of test {t}", "tag": TAG_NAMES[q % len(TAG_NAMES)],
+            } for t in new_ids for q in range(questions)])
+    if new_ids:
+        migrate_question_counts(engine)
+    return max(have, total)
+
+
+def case_test_queries(args, rng: random.Random) -> dict:
+    """Statements per request on the admin test endpoints at 10 / 100 / 1000 tests. Eager loading
+    keeps them constant; a lazy load per test would grow with the count. ok=False if any changes."""
+    endpoints = {
+        "list": lambda n: "/admin/tests",
+        "summary": lambda n: "/admin/tests?fields=summary",
+        "stats": lambda n: "/admin/tests/stats",
+        "one": lambda n: f"/admin/tests/{n}",
+    }
+
+    async def run():
+        levels = {}
+        async with bench_client() as (client, admin):
+            for level in sorted({max(level, args.tests) for level in TEST_LEVELS}):
+                total = top_up_tests(level, args.questions)
+                row = {}
+                for name, url_of in endpoints.items():
+                    await client.get(url_of(total), headers=admin)     # warm-up: compile / principal cache
+                    started = time.perf_counter()
+                    response = await client.get(url_of(total), headers=admin)
+                    row[name] = {
+                        "queries": int(response.headers["x-query-count"]),
+                        "ms": round((time.perf_counter() - started) * 1000, 2),
+                        "bytes": len(response.content),
+                    }
+                levels[str(total)] = row
+                print(f"{total:>6} tests  " + "  ".join(f"{name} {r['queries']} queries {r['ms']:>8.2f} ms" for name, r in row.items()))
+        return levels
+
+    levels = asyncio.run(run())
+    constant = {name: len({row[name]["queries"] for row in levels.values()}) == 1 for name in endpoints}
+    print("query count constant:", "ok" if all(constant.values()) else f"FAILED {constant}")
+    return {"levels": levels, "constant": constant, "ok": all(constant.values())}
+
+
+QUESTION_LEVELS = (10, 100, 1000)
+
+# "before": the question writes as the routes did them originally - the test committed first, then one
+# ORM object per question and a second commit; updates cleared the relationship and re-added everything
+def legacy_create(db, name: str, questions) -> int:
+    from models import CareerTest, Question
+    test = CareerTest(name=name, description="bench", number_of_questions=len(questions), last_updated=datetime.utcnow())
+    db.add(test)
+    db.commit()
+    db.refresh(test)
+    for q in questions:
+        db.add(Question(test_id=test.id, description=q.description, tag=q.tag))
+    db.commit()
+    return test.id
+
+def legacy_update(db, test_id: int, questions):
+    from models import CareerTest, Question
+    test = db.query(CareerTest).filter(CareerTest.id == test_id).first()
+    test.last_updated = datetime.utcnow()
+    test.questions.clear()
+    for q in questions:
+        test.questions.append(Question(description=q.description, tag=q.tag))
+    db.commit()
+
+# "after": what the routes do now - one transaction, executemany inserts, diffed updates, INSERT ... SELECT copies
+def bulk_create(db, name: str, questions) -> int:
+    from models import CareerTest
+    from crud import bulk_insert_questions
+    test = CareerTest(name=name, description="bench", last_updated=datetime.utcnow())
+    db.add(test)
+    db.flush()
+    bulk_insert_questions(db, test.id, questions)
+    db.commit()
+    return test.id
+
+def bulk_update(db, test_id: int, questions):
+    from models import CareerTest
+    from crud import sync_questions
+    db.get(CareerTest, test_id).last_updated = datetime.utcnow()
+    sync_questions(db, test_id, questions)
+    db.commit()
+
+def bulk_duplicate(db, test_id: int) -> int:
+    from models import CareerTest
+    from crud import copy_questions, copy_name
+    source = db.get(CareerTest, test_id)
+    copy = CareerTest(name=copy_name(db, source.name), description=source.description, last_updated=datetime.utcnow())
+    db.add(copy)
+    db.flush()
+    copy_questions(db, test_id, copy.id)
+    db.commit()
+    return copy.id
+
+
+def case_question_writes(args, rng: random.Random) -> dict:
+    """Create / update (one question edited) / duplicate a test of 10, 100 and 1000 questions, the
+    original per-row way vs the bulk way. Median of several runs, straight on the session (no HTTP)."""
+    from sqlalchemy import select
+    from database import SessionLocal
+    from models import Question
+    from schemas import QuestionCreateSchema, QuestionSchema
+
+    def median_ms(fn, repeat):
+        times = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - started)
+        return round(sorted(times)[len(times) // 2] * 1000, 2)
+
+    def edited(db, test_id):
+        rows = db.execute(select(Question.id, Question.description, Question.tag).where(Question.test_id == test_id).order_by(Question.id)).all()
+        questions = [QuestionSchema(id=r.id, description=r.description, tag=r.tag) for r in rows]
+        questions[len(questions) // 2].description += f" (edited {time.time_ns()})"
+        return questions
+
+    levels = {}
+    with SessionLocal() as db:
+        for n in QUESTION_LEVELS:
+            repeat = max(3, min(30, 3000 // n))
+            questions = [QuestionCreateSchema(description=f"Question {q}", tag=TAG_NAMES[q % 6]) for q in range(n)]
+            unique = lambda kind: f"{kind} {n} {time.time_ns()}"
+            old_id = legacy_create(db, unique("legacy"), questions)
+            new_id = bulk_create(db, unique("bulk"), questions)
+            row = {
+                "create": {
+                    "before_ms": median_ms(lambda: legacy_create(db, unique("legacy"), questions), repeat),
+                    "after_ms": median_ms(lambda: bulk_create(db, unique("bulk"), questions), repeat),
+                },
+                "update_one_question": {
+                    "before_ms": median_ms(lambda: legacy_update(db, old_id, edited(db, old_id)), repeat),
+                    "after_ms": median_ms(lambda: bulk_update(db, new_id, edited(db, new_id)), repeat),
+                },
+                "duplicate": {
+                    "before_ms": median_ms(lambda: legacy_create(db, unique("legacy copy"), questions), repeat),
+                    "after_ms": median_ms(lambda: bulk_duplicate(db, new_id), repeat),
+                },
+            }
+            for r in row.values():
+                r["speedup"] = round(r["before_ms"] / r["after_ms"], 1) if r["after_ms"] else None
+            levels[str(n)] = row
+            print(f"{n:>5} questions  " + "  ".join(
+                f"{op} {r['before_ms']:.1f} -> {r['after_ms']:.1f} ms (x{r['speedup']})" for op, r in row.items()
+            ))
+    return {"levels": levels}
+
+
+CLIENTS = 50
+CLIENT_ENDPOINTS = ("homepage", "login", "register", "admin-students", "admin-test", "test-submit", "career-page", "career-pages-summary")
+
+def case_clients(args, rng: random.Random) -> dict:
+    """Requests/s with 50 concurrent clients over real HTTP (uvicorn on a local port, one worker),
+    for the routes that share the database layer: the async ones and the threadpool ones."""
+    import main
+
+    async def run():
+        results = {}
+        async with bench_client(f"http://127.0.0.1:{port}") as (client, admin):
+            scenarios = endpoint_scenarios(args, rng, admin)
+            for name in CLIENT_ENDPOINTS:
+                await run_endpoint(client, scenarios[name], min(10, args.requests), 1)
+                results[name] = await run_endpoint(client, scenarios[name], args.requests, CLIENTS)
+                print_row(name, results[name])
+        return results
+
+    server, thread, port, _ = serve_in_thread(main.app)
+    try:
+        results = asyncio.run(run())
+    finally:
+        server.should_exit = True
+        thread.join()
+    return {"clients": CLIENTS, "endpoints": results}
+
+
+LOGIN_CONCURRENCY = (1, 8, 32, 64)
+
+def case_login(args, rng: random.Random) -> dict:
+    """/login p50 / p99 as concurrent clients go up (scrypt runs in the bounded hash pool, so latency
+    grows with the queue, not the event loop). At the top level a wrong password and an unknown email
+    are timed too - they should cost the same as a good login."""
+    from security import SCRYPT_N, HASH_WORKERS
+
+    def login(password: str, known: bool = True):
+        def make_request(i):
+            email = f"student{rng.randint(0, args.students - 1)}@example.com" if known else f"nobody{i}@example.com"
+            return "POST", "/login", {"json": {"email": email, "password": password}}
+        return make_request
+
+    async def run():
+        results = {}
+        async with bench_client() as (client, admin):
+            await run_endpoint(client, login("student-password"), 10, 1)
+            for clients in LOGIN_CONCURRENCY:
+                results[f"ok-{clients}"] = await run_endpoint(client, login("student-password"), args.requests, clients)
+                print_row(f"login x{clients}", results[f"ok-{clients}"])
+            top = LOGIN_CONCURRENCY[-1]
+            results[f"wrong-password-{top}"] = await run_endpoint(client, login("wrong-password"), args.requests, top)
+            print_row(f"wrong password x{top}", results[f"wrong-password-{top}"])
+            results[f"unknown-email-{top}"] = await run_endpoint(client, login("student-password", known=False), args.requests, top)
+            print_row(f"unknown email x{top}", results[f"unknown-email-{top}"])
+        return results
+
+    print(f"scrypt N={SCRYPT_N}, {HASH_WORKERS} hash worker(s)")
+    return {"scrypt_n": SCRYPT_N, "hash_workers": HASH_WORKERS, "levels": asyncio.run(run())}
+
+
+def case_page_cache(args, rng: random.Random) -> dict:
+    """Latency of the cached career page responses: uncached (entry dropped before every request, so
+    each one queries and serializes), served from the cache, and revalidated with If-None-Match (304).
+    One client at a time, so these are per-request costs rather than throughput under load. The client
+    accepts gzip like a browser would; list-cached-identity shows what is left without compression."""
+    import main
+    cache = main.career_page_cache
+    slug = lambda: f"page-{rng.randint(1, args.pages)}"
+
+    def uncached_page(i):
+        s = slug()
+        cache.invalidate(("slug", s))
+        return "GET", f"/career-pages/{s}", {}
+
+    def uncached_list(i):
+        cache.invalidate()      # bumps the version, which drops the list entry
+        return "GET", "/career-pages", {}
+
+    async def run():
+        results = {}
+        async with bench_client() as (client, admin):
+            etags = {}
+            for page_id in range(1, args.pages + 1):
+                etags[f"page-{page_id}"] = (await client.get(f"/career-pages/page-{page_id}")).headers["etag"]
+            list_etag = (await client.get("/career-pages")).headers["etag"]
+
+            def revalidated_page(i):
+                s = slug()
+                return "GET", f"/career-pages/{s}", {"headers": {"If-None-Match": etags[s]}}
+
+            scenarios = {
+                "page-uncached": uncached_page,
+                "page-cached": lambda i: ("GET", f"/career-pages/{slug()}", {}),
+                "page-304": revalidated_page,
+                "list-uncached": uncached_list,
+                "list-cached": lambda i: ("GET", "/career-pages", {}),
+                "list-cached-identity": lambda i: ("GET", "/career-pages", {"headers": {"Accept-Encoding": "identity"}}),     # without gzip
+                "list-304": lambda i: ("GET", "/career-pages", {"headers": {"If-None-Match": list_etag}}),
+            }
+            for name, make_request in scenarios.items():
+                if name == "list-cached":
+                    await client.get("/career-pages")       # rebuild after the uncached run dropped it
+                before = cache.stats()
+                results[name] = await run_endpoint(client, make_request, args.requests, 1)
+                after = cache.stats()
+                results[name]["cache_hits"] = after["hits"] - before["hits"]
+                results[name]["cache_misses"] = after["misses"] - before["misses"]
+                print_row(name, results[name])
+        return results
+
+    results = asyncio.run(run())
+    for kind in ("page", "list"):
+        print(f"{kind}: cached is x{results[f'{kind}-uncached']['p50_ms'] / max(results[f'{kind}-cached']['p50_ms'], 0.001):.1f} faster at p50")
+    return {"pages": args.pages, "scenarios": results, "cache": cache.stats()}
+
+
+TREE_LEVELS = (100, 1000, 10000)
+
+def case_tree(args, rng: random.Random) -> dict:
+    """Statements per request for /career-pages/tree and the deepest page's /ancestors as the library
+    grows to 10k pages. The materialized paths make both a single indexed read; ok=False if the count moves."""
+    from sqlalchemy import select
+    from database import engine
+    from models import CareerPage
+
+    async def run():
+        levels = {}
+        async with bench_client() as (client, admin):
+            for level in sorted({max(level, args.pages) for level in TREE_LEVELS}):
+                with engine.begin() as conn:
+                    paths = dict(conn.execute(select(CareerPage.id, CareerPage.path)).all())
+                    insert_pages(conn, rng, range(len(paths) + 1, level + 1), paths)
+                    deepest = conn.execute(select(CareerPage.slug, CareerPage.depth).order_by(CareerPage.depth.desc()).limit(1)).first()
+                row = {"depth": deepest.depth}
+                for name, url in (("tree", "/career-pages/tree"), ("ancestors", f"/career-pages/{deepest.slug}/ancestors")):
+                    await client.get(url)
+                    started = time.perf_counter()
+                    response = await client.get(url, headers={"Accept-Encoding": "identity"})
+                    row[name] = {
+                        "queries": int(response.headers["x-query-count"]),
+                        "ms": round((time.perf_counter() - started) * 1000, 2),
+                        "bytes": len(response.content),
+                    }
+                levels[str(level)] = row
+                print(f"{level:>6} pages (depth {deepest.depth:>2})  " + "  ".join(
+                    f"{name} {row[name]['queries']} queries {row[name]['ms']:>8.2f} ms" for name in ("tree", "ancestors")
+                ))
+        return levels
+
+    levels = asyncio.run(run())
+    constant = {name: len({row[name]["queries"] for row in levels.values()}) == 1 for name in ("tree", "ancestors")}
+    print("query count constant:", "ok" if all(constant.values()) else f"FAILED {constant}")
+    return {"levels": levels, "constant": constant, "ok": all(constant.values())}
+
+
+UPLOADS = 64
+UPLOAD_SIDE = 1320         # a 1320 x 1320 noise PNG is ~5 MB and doesn't compress
+
+async def measure_loop_lag(stop: asyncio.Event, interval: float = 0.005) -> list:
+    """How late a timer that should fire every `interval` seconds wakes up - the event loop's stall time."""
+    lags = []
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(max(0.0, time.perf_counter() - started - interval))
+    return lags
+
+def lag_summary(lags: list) -> dict:
+    lags = sorted(lags)
+    return {
+        "samples": len(lags),
+        "p50_ms": round(percentile(lags, 50) * 1000, 2),
+        "p99_ms": round(percentile(lags, 99) * 1000, 2),
+        "max_ms": round(lags[-1] * 1000, 2) if lags else 0.0,
+    }
+
+
+def case_uploads(args, rng: random.Random) -> dict:
+    """Event loop lag of a uvicorn server while --concurrency clients upload 5 MB thumbnails to
+    /career-pages/upload (64 in all). The probe runs on the server's loop; the clients have their own."""
+    import io
+    import numpy as np
+    from PIL import Image
+    import httpx
+    import main
+
+    pixels = np.random.default_rng(args.seed).integers(0, 256, (UPLOAD_SIDE, UPLOAD_SIDE, 3), dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, "PNG", compress_level=1)
+    image = buffer.getvalue()
+    size_mb = len(image) / 2 ** 20
+
+    server, thread, port, loop = serve_in_thread(main.app)
+
+    def probe():
+        stop = asyncio.Event()
+        lags = asyncio.run_coroutine_threadsafe(measure_loop_lag(stop), loop)
+        return stop, lags
+
+    async def upload_all():
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=300) as client:
+            def make_request(i):
+                unique = image + f"bench-{i}-{time.time_ns()}".encode()     # after IEND: same picture, new content hash
+                return "POST", "/career-pages/upload", {
+                    "data": {"title": f"Upload {i}", "slug": f"upload-{i}-{time.time_ns()}", "content": "<p>upload</p>"},
+                    "files": {"thumbnail": (f"photo-{i}.png", unique, "image/png")},
+                }
+            return await run_endpoint(client, make_request, UPLOADS, args.concurrency)
+
+    try:
+        stop, lags = probe()
+        time.sleep(1)
+        loop.call_soon_threadsafe(stop.set)
+        idle = lag_summary(lags.result())
+
+        stop, lags = probe()
+        uploads = asyncio.run(upload_all())
+        loop.call_soon_threadsafe(stop.set)
+        busy = lag_summary(lags.result())
+    finally:
+        server.should_exit = True
+        thread.join()
+
+    uploads["mb_per_s"] = round(UPLOADS * size_mb / (UPLOADS / uploads["throughput_rps"]), 1)
+    print(f"{UPLOADS} uploads of {size_mb:.1f} MB, {args.concurrency} at a time: {uploads['throughput_rps']} uploads/s "
+          f"({uploads['mb_per_s']} MB/s), p50 {uploads['p50_ms']} ms, p99 {uploads['p99_ms']} ms, {uploads['statuses']}")
+    print(f"event loop lag  idle: p50 {idle['p50_ms']} p99 {idle['p99_ms']} max {idle['max_ms']} ms   "
+          f"uploading: p50 {busy['p50_ms']} p99 {busy['p99_ms']} max {busy['max_ms']} ms")
+    return {"upload_mb": round(size_mb, 2), "uploads": uploads, "loop_lag_idle": idle, "loop_lag_uploading": busy}
+
+
+def photo(rng: random.Random, width: int = 2016, height: int = 1512) -> bytes:
+    """A phone-photo sized JPEG: a colour gradient with noise, so it doesn't resize to a flat block."""
+    import io
+    import numpy as np
+    from PIL import Image
+    noise = np.random.default_rng(rng.randint(0, 2 ** 32)).integers(0, 40, (height, width, 3), dtype=np.uint8)
+    gradient = np.linspace(0, 200, width, dtype=np.uint8)[None, :, None]
+    colour = np.array([rng.randint(0, 55) for _ in range(3)], dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(gradient + noise + colour).save(buffer, "JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def case_thumbnails(args, rng: random.Random) -> dict:
+    """The thumbnail pipeline over a batch of --images phone-sized JPEGs: one page each, every
+    queue_thumbnail call made at once (as a burst of uploads would), variants made in the process
+    pool and recorded on the pages. Then the lazy path: a missing variant made on request."""
+    from concurrent.futures import wait
+    from sqlalchemy import insert, select, func
+    from database import engine, SessionLocal
+    from models import CareerPage
+    from uploads import UPLOAD_DIR
+    from thumbnails import queue_thumbnail, VARIANT_DIR, VARIANT_WIDTHS, VARIANT_FORMATS, THUMBNAIL_WORKERS, get_pool
+
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    originals = [photo(rng) for _ in range(10)]     # encoding 1000 distinct photos would take longer than the benchmark
+    with engine.begin() as conn:
+        first_id = conn.scalar(select(func.coalesce(func.max(CareerPage.id), 0))) + 1
+        pages = []
+        for n in range(args.images):
+            with open(os.path.join(UPLOAD_DIR, f"bench-photo-{n}.jpg"), "wb") as f:
+                f.write(originals[n % len(originals)])
+            pages.append({
+                "id": first_id + n, "title": f"Photo {n}", "slug": f"photo-{n}", "content": "<p>photo</p>",
+                "thumbnail_url": f"/uploads/bench-photo-{n}.jpg", "path": f"/{first_id + n}/", "depth": 0,
+            })
+        conn.execute(insert(CareerPage), pages)
+    batch_mb = sum(len(originals[n % len(originals)]) for n in range(args.images)) / 2 ** 20
+
+    get_pool().submit(int).result()     # start the worker processes outside the timing
+    started = time.perf_counter()
+    wait([queue_thumbnail(p["id"], p["thumbnail_url"], SessionLocal) for p in pages])
+    wall = time.perf_counter() - started
+
+    with SessionLocal() as db:
+        recorded = db.scalar(select(func.count(CareerPage.id)).where(CareerPage.id >= first_id, CareerPage.thumbnail_variants.isnot(None)))
+    made = len([f for f in os.listdir(VARIANT_DIR) if f.startswith("bench-photo-")])
+
+    # Lazy path: drop one variant and let /thumbnails/ make it again
+    async def lazy():
+        async with bench_client() as (client, admin):
+            latencies = []
+            for n in range(min(50, args.images)):
+                name = f"bench-photo-{n}-{VARIANT_WIDTHS[1]}.webp"
+                os.remove(os.path.join(VARIANT_DIR, name))
+                started = time.perf_counter()
+                response = await client.get(f"/thumbnails/{name}")
+                latencies.append(time.perf_counter() - started)
+                assert response.status_code == 200, response.status_code
+            hits = []
+            for n in range(min(50, args.images)):
+                started = time.perf_counter()
+                await client.get(f"/thumbnails/bench-photo-{n}-{VARIANT_WIDTHS[1]}.webp")
+                hits.append(time.perf_counter() - started)
+            return sorted(latencies), sorted(hits)
+
+    missing, present = asyncio.run(lazy())
+    result = {
+        "images": args.images,
+        "image_mb": round(batch_mb / args.images, 2),
+        "thumbnail_workers": THUMBNAIL_WORKERS,
+        "seconds": round(wall, 2),
+        "images_per_s": round(args.images / wall, 1),
+        "variants_per_s": round(made / wall, 1),
+        "variants_made": made,
+        "variants_expected": args.images * len(VARIANT_WIDTHS) * len(VARIANT_FORMATS),
+        "pages_recorded": recorded,
+        "lazy_missing_p50_ms": round(percentile(missing, 50) * 1000, 2),
+        "lazy_present_p50_ms": round(percentile(present, 50) * 1000, 2),
+    }
+    print(f"{args.images} photos ({result['image_mb']} MB each) with {THUMBNAIL_WORKERS} worker process(es): {result['seconds']} s, "
+          f"{result['images_per_s']} images/s, {result['variants_per_s']} variants/s "
+          f"({made}/{result['variants_expected']} variants, {recorded} pages recorded)")
+    print(f"lazy /thumbnails/: missing variant p50 {result['lazy_missing_p50_ms']} ms, already made p50 {result['lazy_present_p50_ms']} ms")
+    return result
+
+
+def case_serialization(args, rng: random.Random) -> dict:
+    """Serializing the big admin / library payloads, without HTTP. "default" is what FastAPI did with a
+    handler returning model_validate()d objects: validate, dump to dicts, validate again against
+    response_model, jsonable_encoder, json.dumps. "fast" is responses.fast_json: one validation and
+    pydantic-core's dump_json. gzip is the compression middleware's cost for the same body."""
+    import gzip
+    from pydantic import TypeAdapter
+    from fastapi.encoders import jsonable_encoder
+    from sqlalchemy import select
+    from sqlalchemy.orm import selectinload
+    from database import SessionLocal
+    from models import Student, CareerTest, CareerPage
+    from schemas import StudentSchema, CareerTestSchema, CareerPageOut
+    from responses import COMPRESS_LEVEL
+
+    def median_ms(fn, repeat=5):
+        times = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = fn()
+            times.append(time.perf_counter() - started)
+        return round(sorted(times)[len(times) // 2] * 1000, 2), result
+
+    results = {}
+    with SessionLocal() as db:
+        payloads = {
+            "admin-students": (StudentSchema, db.execute(select(Student)).scalars().all()),
+            "admin-tests": (CareerTestSchema, db.execute(select(CareerTest).options(selectinload(CareerTest.questions))).scalars().all()),
+            "career-pages": (CareerPageOut, db.execute(select(CareerPage)).scalars().all()),
+        }
+        for name, (schema, rows) in payloads.items():
+            adapter = TypeAdapter(list[schema])
+
+            def default():
+                returned = [schema.model_validate(row, from_attributes=True) for row in rows]
+                checked = adapter.validate_python([item.model_dump() for item in returned])
+                return json.dumps(jsonable_encoder(checked)).encode()
+
+            def fast():
+                return adapter.dump_json(adapter.validate_python(rows, from_attributes=True))
+
+            default_ms, body = median_ms(default)
+            fast_ms, fast_body = median_ms(fast)
+            gzip_ms, compressed = median_ms(lambda: gzip.compress(fast_body, COMPRESS_LEVEL))
+            results[name] = {
+                "rows": len(rows),
+                "bytes": len(fast_body),
+                "gzip_bytes": len(compressed),
+                "default_ms": default_ms,
+                "fast_ms": fast_ms,
+                "speedup": round(default_ms / fast_ms, 1) if fast_ms else None,
+                "gzip_ms": gzip_ms,
+                "same_json": json.loads(body) == json.loads(fast_body),
+            }
+            r = results[name]
+            print(f"{name:<16} {r['rows']:>6} rows {r['bytes'] / 2 ** 20:>6.2f} MB  default {r['default_ms']:>8.2f} ms  "
+                  f"fast {r['fast_ms']:>8.2f} ms  (x{r['speedup']})  gzip {r['gzip_ms']:>7.2f} ms -> {r['gzip_bytes'] / 2 ** 20:.2f} MB"
+                  + ("" if r["same_json"] else "  OUTPUT DIFFERS"))
+    return {"endpoints": results, "ok": all(r["same_json"] for r in results.values())}
+
+
+CASES = {
+    "registrations": case_registrations,
+    "test-queries": case_test_queries,
+    "question-writes": case_question_writes,
+    "clients": case_clients,
+    "login": case_login,
+    "page-cache": case_page_cache,
+    "tree": case_tree,
+    "uploads": case_uploads,
+    "thumbnails": case_thumbnails,
+    "serialization": case_serialization,
+}
+
+
+def measure_startup(workdir: str, workers: int) -> dict:
+    """Seconds from launching `uvicorn main:app --workers N` until it answers /homepage."""
+    import socket, urllib.request
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    env = dict(os.environ, MIGRATE_ON_STARTUP="0")
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--workers", str(workers), "--port", str(port), "--log-level", "warning"],
+        cwd=os.path.dirname(os.path.abspath(__file__)), env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - started < 60:
+            try:
+                urllib.request.urlopen(f"http://127.0.0.1:{port}/homepage", timeout=1).read()
+                return {"workers": workers, "first_request_seconds": round(time.perf_counter() - started, 2)}
+            except OSError:
+                if server.poll() is not None:
+                    return {"workers": workers, "error": "uvicorn exited (is it installed?)"}
+                time.sleep(0.02)
+        return {"workers": workers, "error": "no response within 60 s"}
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def print_row(name: str, r: dict):
+    queries = "-" if r["sql_queries_per_request"] is None else f"{r['sql_queries_per_request']} ({r['sql_queries_total']} total)"
+    print(f"{name:<24} {r['throughput_rps']:>9.1f} rps  p50 {r['p50_ms']:>8.2f}  p95 {r['p95_ms']:>8.2f}  "
+          f"p99 {r['p99_ms']:>8.2f} ms  sql {queries:<16}  rss {r['peak_rss_mb']:>7.1f} MB  {r['statuses']}")
+
+def print_comparison(previous: dict, current: dict):
+    print(f"\nChange against {previous['meta']['timestamp']} (negative latency / positive throughput is better)")
+    if previous["meta"]["volumes"] != current["meta"]["volumes"]:
+        print("Note: the two runs seeded different volumes")
+    for name, r in current["results"].items():
+        old = previous["results"].get(name)
+        if not old:
+            continue
+        change = lambda key: f"{(r[key] - old[key]) / old[key] * 100:+6.1f}%" if old.get(key) else "     -"
+        print(f"{name:<24} rps {change('throughput_rps')}  p50 {change('p50_ms')}  p99 {change('p99_ms')}")
+
+
+def main():
+    args = parse_args()
+    only = set(args.only.split(",")) if args.only else None
+    rng = random.Random(args.seed)
+
+    with tempfile.TemporaryDirectory(prefix="career-bench-") as workdir:
+        configure_environment(workdir, args)
+        logging.getLogger("sql.slow").setLevel(logging.ERROR)      # writers queue on SQLite's lock under load - counted, not printed
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        seeded = seed(args, rng)
+        print(f"Seeded {args.students} students, {args.tests}x{args.questions} questions, {args.pages} pages in {seeded['seconds']} s\n")
+
+        if args.case:
+            results = {args.case: CASES[args.case](args, rng)}
+        else:
+            results = asyncio.run(run_all(args, rng, only))
+        startup = measure_startup(workdir, args.startup_workers) if args.startup_workers else None
+
+        # the app's lifespan isn't run in process - finish the queued jobs before their files go away
+        from thumbnails import drain_jobs
+        from scoring import drain_rescores
+        drain_jobs()
+        drain_rescores()
+
+    import sqlalchemy, fastapi, pydantic
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "git_commit": subprocess.run(
+                ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))
+            ).stdout.strip() or None,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "versions": {"fastapi": fastapi.__version__, "sqlalchemy": sqlalchemy.__version__, "pydantic": pydantic.__version__},
+            "volumes": {"students": args.students, "tests": args.tests, "questions_per_test": args.questions, "pages": args.pages},
+            "requests_per_endpoint": args.requests,
+            "concurrency": args.concurrency,
+            "single_writer": args.single_writer,
+            "seed": args.seed,
+            "seed_seconds": seeded["seconds"],
+        },
+        "results": results,
+        "startup": startup,
+    }
+    if startup:
+        print(f"\nuvicorn --workers {startup['workers']}: {startup.get('first_request_seconds', startup.get('error'))}")
+
+    out = args.out or f"bench-{datetime.now():%Y%m%d-%H%M%S}.json"
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults saved to {out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            print_comparison(json.load(f), report)
+    if any(isinstance(r, dict) and r.get("ok") is False for r in results.values()):
+        sys.exit(1)     # a case that asserts something (e.g. a constant query count) failed
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+# cache.py - Cache of serialized JSON responses with strong ETags (career pages)
+import os, gzip, time, hashlib, threading
+from typing import Callable, Optional
+from fastapi import Request, Response
+from responses import COMPRESS_RESPONSES, COMPRESS_MIN_SIZE, COMPRESS_LEVEL
+
+# In-process, so other workers only see an invalidation once their copy expires - keep the TTL short
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "60"))      # seconds
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "5000"))
+
+
+class CachedBody:
+    """A body plus its gzipped copy, made on the first request that accepts gzip. Each has its own
+    strong ETag - they are different bytes, so a tag must never match the other one."""
+    __slots__ = ("body", "etag", "gzipped", "expires")
+
+    def __init__(self, body: bytes, ttl: float):
+        self.body = body
+        self.etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+        self.gzipped = None
+        self.expires = time.monotonic() + ttl
+
+    def gzip(self) -> bytes:
+        if self.gzipped is None:
+            self.gzipped = gzip.compress(self.body, compresslevel=COMPRESS_LEVEL, mtime=0)    # mtime=0: same bytes every time
+        return self.gzipped
+
+
+class SingleFlight:
+    """Concurrent calls for the same key share one execution: the first caller runs it, the others
+    wait for its result (or its exception). Nothing is kept once the call finishes."""
+
+    class Call:
+        __slots__ = ("done", "result", "error")
+
+        def __init__(self):
+            self.done = threading.Event()
+            self.result = None
+            self.error = None
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.shared = 0     # callers that got another caller's result
+
+    def do(self, key, fn: Callable):
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = self.Call()
+            else:
+                self.shared += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.done.set()
+
+
+class ResponseCache:
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = {}
+        self.lock = threading.Lock()
+        self.flight = SingleFlight()     # a burst of misses for one key (a viral page) builds it once
+        self.gzip_flight = SingleFlight()    # ... and gzips it once
+        self.version = 0        # bumped on every write, part of the key of list responses
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def get_or_build(self, key, build: Callable[[], bytes]) -> CachedBody:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and entry.expires > time.monotonic():
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        return self.flight.do(key, lambda: self._build(key, build))
+
+    def _build(self, key, build: Callable[[], bytes]) -> CachedBody:
+        version = self.version
+        entry = CachedBody(build(), self.ttl)
+        with self.lock:
+            if self.version == version:     # not invalidated while building - otherwise serve it once, don't keep it
+                if len(self.entries) >= self.maxsize:
+                    self.entries.clear()
+                self.entries[key] = entry
+        return entry
+
+    def invalidate(self, *keys):
+        with self.lock:
+            self.version += 1
+            for key in keys:
+                self.entries.pop(key, None)
+            # list responses were keyed by the old version - drop them instead of waiting for the TTL
+            for key in [k for k in self.entries if k[0] == "list"]:
+                del self.entries[key]
+
+    def stats(self) -> dict:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "not_modified": self.not_modified,
+                "coalesced": self.flight.shared,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "size": len(self.entries),
+                "version": self.version,
+            }
+
+career_page_cache = ResponseCache(RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL)
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match uses the weak comparison: W/"x" matches "x" (RFC 9110 13.1.2)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return etag.removeprefix("W/") in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+
+
+def cached_json_response(request: Request, cache: ResponseCache, key, build: Callable[[], bytes]) -> Response:
+    """Serve `key` from the cache (building it on a miss), answering 304 when the client already has it.
+
+    Bodies over COMPRESS_MIN_SIZE are gzipped here, once per cache entry, under their own ETag. Left to
+    the middleware (which passes responses with a Content-Encoding through) the same bytes were gzipped
+    again on every hit and sent under the identity body's strong ETag."""
+    entry = cache.get_or_build(key, build)
+    headers = {"Cache-Control": "no-cache", "Vary": "Accept-Encoding"}     # always revalidate, which is a 304 when unchanged
+
+    body, etag = entry.body, entry.etag
+    if COMPRESS_RESPONSES and len(body) >= COMPRESS_MIN_SIZE and "gzip" in request.headers.get("accept-encoding", ""):
+        body = entry.gzipped or cache.gzip_flight.do(key, entry.gzip)
+        etag = etag[:-1] + '-gzip"'
+        headers["Content-Encoding"] = "gzip"
+    headers["ETag"] = etag
+
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        with cache.lock:
+            cache.not_modified += 1
+        headers.pop("Content-Encoding", None)
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -1,7 +1,12 @@
 # crud/career.py - Contains logic for - Creating a career page, Getting all career pages, Getting a page by slug
+import math, base64, json
+from typing import Optional
+from sqlalchemy import tuple_, select, insert, update, delete, literal, func, case, text, inspect
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import Session
-from models import CareerPage
+from models import CareerPage, Student, Question, CareerTest
 from schemas import CareerPageCreate
+from search import student_search_filter
 
 def create_career_page(db: Session, page: CareerPageCreate):
     db_page = CareerPage(**page.dict())
@@ -15,3 +20,204 @@ def get_all_pages(db: Session):
 
 def get_page_by_slug(db: Session, slug: str):
     return db.query(CareerPage).filter(CareerPage.slug == slug).first()
+
+
+
+
+
+# Keyset (cursor) pagination for the admin student list.
+# The cursor is the (sort value, id) of the last row of the previous page, so every page is one
+# index range scan no matter how deep into the list the admin has scrolled - no OFFSET.
+def encode_cursor(sort_value, row_id: int) -> str:
+    raw = json.dumps([sort_value, row_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+# Cursors come back from the client, so anything that isn't a value we could have encoded is
+# rejected here (as a 400) instead of reaching SQL
+INT64_MIN, INT64_MAX = -2 ** 63, 2 ** 63 - 1
+
+def _is_int64(value) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool) and INT64_MIN <= value <= INT64_MAX
+
+def decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        sort_value, row_id = json.loads(raw)
+    except (ValueError, TypeError, OverflowError):
+        raise ValueError("Invalid cursor")
+    valid_sort_value = (
+        isinstance(sort_value, str)
+        or _is_int64(sort_value)
+        or (isinstance(sort_value, float) and math.isfinite(sort_value))
+    )
+    if not valid_sort_value or not _is_int64(row_id):
+        raise ValueError("Invalid cursor")
+    return sort_value, row_id
+
+def get_students_page(db: Session, search: str, sort_by: str, order: str, limit: int, cursor: Optional[str] = None):
+    query = db.query(Student)
+
+    if search:
+        query = query.filter(student_search_filter(search, db.get_bind().dialect.name))
+
+    sort_column = getattr(Student, sort_by)
+    key = tuple_(sort_column, Student.id) if sort_by != "id" else Student.id
+
+    if cursor:
+        sort_value, last_id = decode_cursor(cursor)
+        after = tuple_(sort_value, last_id) if sort_by != "id" else last_id
+        query = query.filter(key < after if order == "desc" else key > after)
+
+    if order == "desc":
+        query = query.order_by(sort_column.desc(), Student.id.desc())
+    else:
+        query = query.order_by(sort_column.asc(), Student.id.asc())
+
+    # Fetch one extra row to know whether there is a next page without a COUNT(*)
+    students = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(students) > limit:
+        students = students[:limit]
+        last = students[-1]
+        next_cursor = encode_cursor(getattr(last, sort_by), last.id)
+    return students, next_cursor
+
+
+
+
+
+# Question writes for career tests. Everything here only flushes - the endpoint commits once,
+# so a test and its questions are saved (or rolled back) together.
+def bulk_insert_questions(db: Session, test_id: int, questions):
+    rows = [{"test_id": test_id, "description": q.description, "tag": q.tag} for q in questions]
+    if rows:
+        db.execute(insert(Question), rows)      # one executemany instead of one INSERT per ORM object
+    refresh_question_counts(db, test_id)
+
+def sync_questions(db: Session, test_id: int, questions):
+    """Diff the submitted questions against the stored ones and only write what actually changed."""
+    existing = {
+        row.id: (row.description, row.tag)
+        for row in db.execute(select(Question.id, Question.description, Question.tag).where(Question.test_id == test_id))
+    }
+
+    to_insert, to_update, kept_ids = [], [], set()
+    for q in questions:
+        if q.id in existing and q.id not in kept_ids:
+            kept_ids.add(q.id)
+            if existing[q.id] != (q.description, q.tag):
+                to_update.append({"id": q.id, "description": q.description, "tag": q.tag})
+        else:
+            to_insert.append(q)     # new question (no id, or an id that isn't part of this test)
+
+    to_delete = [qid for qid in existing if qid not in kept_ids]
+    if to_delete:
+        db.execute(delete(Question).where(Question.id.in_(to_delete)))
+    if to_update:
+        db.execute(update(Question), to_update)     # bulk UPDATE ... WHERE id = ? (executemany)
+    bulk_insert_questions(db, test_id, to_insert)   # also refreshes the counts
+
+def copy_questions(db: Session, from_test_id: int, to_test_id: int):
+    """INSERT ... SELECT - the question rows are copied inside the database, never loaded into Python."""
+    db.execute(
+        insert(Question).from_select(
+            ["test_id", "description", "tag"],
+            select(literal(to_test_id), Question.description, Question.tag)
+            .where(Question.test_id == from_test_id)
+            .order_by(Question.id)
+        )
+    )
+    refresh_question_counts(db, to_test_id)
+
+def copy_name(db: Session, name: str, tried=()) -> str:
+    """"<name> (Copy)", or "(Copy 2)", "(Copy 3)"... when that is taken - test names are unique.
+    `tried` are names a concurrent copy got to first, in case this transaction can't see them yet."""
+    base = f"{name} (Copy"
+    taken = set(db.scalars(select(CareerTest.name).where(CareerTest.name.startswith(base, autoescape=True))))
+    taken.update(tried)
+    if base + ")" not in taken:
+        return base + ")"
+    n = 2
+    while f"{base} {n})" in taken:
+        n += 1
+    return f"{base} {n})"
+
+
+# Question counts: number_of_questions and questions_r..questions_c on career_tests are recounted by the
+# helpers above in the same transaction as their question writes, so they always match the questions table
+TAG_COUNT_COLUMNS = {letter: f"questions_{letter.lower()}" for letter in "RIASEC"}
+
+def _question_count_columns():
+    tag = func.upper(func.substr(Question.tag, 1, 1))      # tags are stored as "Investigative" or "I"
+    return [func.count(Question.id).label("number_of_questions")] + [
+        func.coalesce(func.sum(case((tag == letter, 1), else_=0)), 0).label(column)
+        for letter, column in TAG_COUNT_COLUMNS.items()
+    ]
+
+def refresh_question_counts(db: Session, test_id: int):
+    counts = db.execute(select(*_question_count_columns()).where(Question.test_id == test_id)).one()
+    db.execute(update(CareerTest).where(CareerTest.id == test_id).values(**counts._asdict()))
+
+def get_test_stats(db: Session) -> dict:
+    """Totals and per-test breakdown straight from the counter columns - no question rows are read."""
+    columns = ["number_of_questions"] + list(TAG_COUNT_COLUMNS.values())
+    rows = db.execute(
+        select(CareerTest.id, CareerTest.name, *[getattr(CareerTest, c) for c in columns]).order_by(CareerTest.id)
+    ).all()
+    tests = [
+        {
+            "id": r.id,
+            "name": r.name,
+            "number_of_questions": r.number_of_questions or 0,
+            "by_tag": {letter: getattr(r, column) for letter, column in TAG_COUNT_COLUMNS.items()},
+        }
+        for r in rows
+    ]
+    return {
+        "tests": len(tests),
+        "questions": sum(t["number_of_questions"] for t in tests),
+        "by_tag": {letter: sum(t["by_tag"][letter] for t in tests) for letter in TAG_COUNT_COLUMNS},
+        "per_test": tests,
+    }
+
+
+# Migration: counter columns + questions.test_id index, then recount every test in one grouped query
+def migrate_question_counts(engine: Engine):
+    inspector = inspect(engine)
+    if not inspector.has_table("career_tests"):
+        return
+    with engine.begin() as conn:
+        existing = [c["name"] for c in inspector.get_columns("career_tests")]
+        for column in TAG_COUNT_COLUMNS.values():
+            if column not in existing:
+                conn.execute(text(f"ALTER TABLE career_tests ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0"))
+        for index in Question.__table__.indexes:
+            index.create(bind=conn, checkfirst=True)
+
+        conn.execute(update(CareerTest).values(number_of_questions=0))
+        counts = conn.execute(select(Question.test_id, *_question_count_columns()).group_by(Question.test_id)).all()
+        columns = ["number_of_questions", *TAG_COUNT_COLUMNS.values()]
+        if counts:
+            conn.execute(
+                text(f"UPDATE career_tests SET {', '.join(f'{c} = :{c}' for c in columns)} WHERE id = :test_id"),
+                [row._asdict() for row in counts]
+            )
+
+# Library index: only the columns the listing shows (no HTML content), as plain rows - no ORM objects
+def iter_page_summaries(db: Session, parent_id: Optional[int] = None, after_id: Optional[int] = None, limit: Optional[int] = None):
+    query = select(
+        CareerPage.id, CareerPage.title, CareerPage.slug, CareerPage.thumbnail_url, CareerPage.thumbnail_variants,
+        CareerPage.riasec_tags, CareerPage.parent_id
+    ).order_by(CareerPage.id)
+
+    if parent_id is not None:
+        query = query.where(CareerPage.parent_id == parent_id)
+    if after_id is not None:
+        query = query.where(CareerPage.id > after_id)
+    if limit is not None:
+        query = query.limit(limit)
+
+    # stream_results + yield_per: rows come off the cursor in batches instead of one big fetchall()
+    result = db.execute(query.execution_options(stream_results=True, yield_per=500))
+    for row in result:
+        yield row._asdict()
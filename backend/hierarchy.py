@@ -0,0 +1,110 @@
+# hierarchy.py - Materialized path for the career page tree ("/1/2/7/" = root 1 > 2 > page 7)
+from typing import Optional
+from sqlalchemy import text, select, update, func, inspect
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from models import CareerPage
+
+
+def subtree_filter(path: str):
+    """Pages whose path starts with `path` (the page itself + all descendants), as an index range:
+    "/1/2/" <= path < "/1/20" works because "0" is the character right after "/"."""
+    return (CareerPage.path >= path) & (CareerPage.path < path[:-1] + "0")
+
+def path_ids(path: Optional[str]) -> list:
+    return [int(part) for part in (path or "").strip("/").split("/") if part]
+
+
+def place_page(db: Session, page: CareerPage, parent_id: Optional[int]):
+    """Set path/depth for a page (new or re-parented) and move its whole subtree along with it.
+    Raises ValueError for a missing parent or a move that would create a cycle."""
+    if parent_id is not None:
+        parent = db.execute(select(CareerPage.id, CareerPage.path, CareerPage.depth).where(CareerPage.id == parent_id)).first()
+        if not parent:
+            raise ValueError("Parent page not found")
+        if parent.id == page.id or (page.path and parent.path.startswith(page.path)):
+            raise ValueError("A page can't be moved under itself or one of its children")
+        new_path, new_depth = f"{parent.path}{page.id}/", parent.depth + 1
+    else:
+        new_path, new_depth = f"/{page.id}/", 0
+
+    old_path, old_depth = page.path, page.depth or 0
+    page.parent_id = parent_id
+    if old_path == new_path:
+        return
+    if old_path:
+        # Descendants: swap the old prefix for the new one in a single UPDATE over the path index range
+        db.execute(
+            update(CareerPage)
+            .where(subtree_filter(old_path), CareerPage.id != page.id)
+            .values(
+                path=new_path + func.substr(CareerPage.path, len(old_path) + 1),
+                depth=CareerPage.depth + (new_depth - old_depth),
+            )
+            .execution_options(synchronize_session=False)
+        )
+    page.path, page.depth = new_path, new_depth
+
+
+def get_ancestors(db: Session, page) -> list:
+    """Root first, the page itself excluded - one primary key lookup for the whole breadcrumb."""
+    ids = path_ids(page.path)[:-1]
+    if not ids:
+        return []
+    rows = db.execute(
+        select(CareerPage.id, CareerPage.title, CareerPage.slug).where(CareerPage.id.in_(ids))
+    ).all()
+    by_id = {r.id: r._asdict() for r in rows}
+    return [by_id[i] for i in ids if i in by_id]
+
+
+def get_tree(db: Session, root_path: Optional[str] = None) -> list:
+    """The whole library (or one subtree) nested, from one query ordered by path."""
+    query = select(
+        CareerPage.id, CareerPage.title, CareerPage.slug, CareerPage.thumbnail_url,
+        CareerPage.riasec_tags, CareerPage.parent_id, CareerPage.depth
+    ).order_by(CareerPage.path)
+    if root_path:
+        query = query.where(subtree_filter(root_path))
+
+    roots, nodes = [], {}
+    for row in db.execute(query):
+        node = dict(row._asdict(), children=[])
+        nodes[row.id] = node
+        parent = nodes.get(row.parent_id)
+        # ordered by path, so a parent always comes before its children
+        (parent["children"] if parent else roots).append(node)
+    return roots
+
+
+# Backfill migration: path/depth columns for databases created before the materialized path
+def migrate_page_paths(engine: Engine):
+    inspector = inspect(engine)
+    if not inspector.has_table("career_pages"):
+        return
+    with engine.begin() as conn:
+        columns = [c["name"] for c in inspector.get_columns("career_pages")]
+        if "path" not in columns:
+            conn.execute(text("ALTER TABLE career_pages ADD COLUMN path VARCHAR(255)"))
+        if "depth" not in columns:
+            conn.execute(text("ALTER TABLE career_pages ADD COLUMN depth INTEGER NOT NULL DEFAULT 0"))
+        for index in CareerPage.__table__.indexes:
+            if any(c.name == "path" for c in index.columns):
+                index.create(bind=conn, checkfirst=True)
+
+        if not conn.execute(select(CareerPage.id).where(CareerPage.path.is_(None)).limit(1)).first():
+            return
+        parents = dict(conn.execute(select(CareerPage.id, CareerPage.parent_id)).all())
+
+        paths = {}
+        def path_of(page_id, seen=()):
+            if page_id not in paths:
+                parent_id = parents.get(page_id)
+                if parent_id is None or parent_id not in parents or parent_id in seen:
+                    paths[page_id] = f"/{page_id}/"         # orphans and cycles become roots
+                else:
+                    paths[page_id] = path_of(parent_id, seen + (page_id,)) + f"{page_id}/"
+            return paths[page_id]
+
+        updates = [{"page_id": i, "path": path_of(i), "depth": path_of(i).count("/") - 2} for i in parents]
+        conn.execute(text("UPDATE career_pages SET path = :path, depth = :depth WHERE id = :page_id"), updates)
@@ -1,28 +1,84 @@
-from fastapi import FastAPI, HTTPException, Query, APIRouter, Depends, UploadFile, File, Form
-from fastapi.staticfiles import StaticFiles
-import shutil, os
+from fastapi import FastAPI, HTTPException, Query, APIRouter, Depends, UploadFile, File, Form, Response, Request
+from fastapi.responses import StreamingResponse, FileResponse, RedirectResponse
+import shutil, os, re, json, time, logging, threading
+from contextlib import asynccontextmanager
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import sessionmaker, Session
-from sqlalchemy import create_engine
-from pydantic import BaseModel
-from models import Base, Student, Admin, CareerTest, Question, datetime, CareerPage
-from schemas import StudentSchema, CareerTestSchema, CareerTestCreateSchema, CareerTestUpdateSchema, Optional, CareerPageCreate, CareerPageOut
-from crud import create_career_page, get_all_pages, get_page_by_slug
+from sqlalchemy.orm import Session, selectinload, subqueryload
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy import select, update, union_all, literal
+from pydantic import BaseModel, TypeAdapter
+from models import Student, Admin, CareerTest, datetime, CareerPage
+from schemas import StudentCreate, StudentSchema, CareerTestSchema, CareerTestSummarySchema, CareerTestCreateSchema, CareerTestUpdateSchema, Optional, CareerPageCreate, CareerPageOut, CareerPageSummary, TestSubmissionCreate, TestResultSchema
+from crud import create_career_page, get_all_pages, get_page_by_slug, get_students_page, iter_page_summaries, encode_cursor, decode_cursor, bulk_insert_questions, sync_questions, copy_questions, copy_name, get_test_stats
+from search import index_page, search_pages
+from security import hash_password, verify_password, is_hashed, DUMMY_HASH
+from auth import create_token, principal_cache, Principal, invalidate_principal, require_admin, get_optional_principal
+from cache import career_page_cache, cached_json_response
+from riasec import RIASEC, tags_to_mask, parse_profile, recommender
+from scoring import submit_answers, rescore_test, queue_rescore, drain_rescores, test_compiler
+from hierarchy import place_page, get_ancestors, get_tree
+from uploads import UPLOAD_DIR, UploadFiles, save_upload, delete_upload, cache_control_for, add_upload_limit
+from thumbnails import VARIANT_WIDTHS, VARIANT_DIR, variant_url, find_original, generate_variant, queue_thumbnail, drain_jobs as drain_thumbnail_jobs
+from responses import fast_json, add_compression
+from transfer import detect_format, import_students, import_tests, export_students, export_tests
+from metrics import METRICS_ENABLED, registry, add_metrics
+from migrations import run_migrations
+from analytics import count_new_students, get_student_stats, start_stats_rebuilder
+from ratelimit import limiter, limit_by_ip
+from database import engine, SessionLocal, get_db, get_write_db, get_async_db, get_async_write_db, begin_savepoint
 from typing import List
-from uuid import uuid4
 
+logger = logging.getLogger("career")
 
 
 
 
-# Database config
-DATABASE_URL = "sqlite:///./test.db"
-engine = create_engine(DATABASE_URL)
-# Base.metadata.create_all(bind=engine)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# Database config lives in database.py (engine, pool, get_db / get_async_db)
+# Schema changes are versioned in migrations.py. Up to date this is one SELECT; with several workers
+# run `python migrations.py` before starting them and set MIGRATE_ON_STARTUP=0.
+MIGRATE_ON_STARTUP = os.getenv("MIGRATE_ON_STARTUP", "1") == "1"
+WARM_CACHES = os.getenv("WARM_CACHES", "1") == "1"
+if MIGRATE_ON_STARTUP:
+    run_migrations(engine)
+
+
+def warm_caches():
+    """Fill the in-process caches before the first user asks: pool connections (and their pragmas),
+    the recommender matrix, compiled tests, the cached library list and the compiled SQL of hot queries."""
+    started = time.perf_counter()
+    db = SessionLocal()
+    try:
+        recommender.rebuild(db)
+        for test_id in db.execute(select(CareerTest.id)).scalars():
+            test_compiler.get(db, test_id)
+        career_page_cache.get_or_build(
+            ("list", career_page_cache.version), lambda: career_page_list_body(db)
+        )
+        get_page_by_slug(db, "")
+        search_pages(db, "warm", 1)
+    except Exception:
+        logger.exception("Cache warm-up failed")
+    finally:
+        db.close()
+    logger.info("Caches warmed in %.0f ms", (time.perf_counter() - started) * 1000)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # In a thread, so the worker starts accepting requests right away
+    if WARM_CACHES:
+        threading.Thread(target=warm_caches, name="warm-caches", daemon=True).start()
+    stop_stats_rebuilder = start_stats_rebuilder(SessionLocal)     # periodic recount of the student_stats rollup
+    yield
+    stop_stats_rebuilder.set()
+    drain_thumbnail_jobs()      # uploads already answered still get their variants
+    drain_rescores()            # ... and edited tests their re-scored results
+
 
 # Create FastAPI app
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # CORS middleware for frontend communication and authentication?
 app.add_middleware(
@@ -30,9 +86,29 @@ app.add_middleware(
     allow_origins=["http://localhost:3000"],  # or ["*"] for all
     allow_credentials=True,
     allow_methods=["*"],
-    allow_headers=["*"],
+    allow_headers=["*"],    # includes Authorization: Bearer <token>
+    expose_headers=["X-Next-Cursor", "ETag", "X-Query-Count", "X-Query-Time"],   # so the admin list can read the next page cursor
 )
 
+# gzip (or brotli if brotli-asgi is installed) for bodies over COMPRESS_MIN_SIZE - opt in with COMPRESS_RESPONSES=1
+add_compression(app)
+
+# 413 for thumbnail uploads over MAX_UPLOAD_BYTES before the multipart body is spooled (see uploads.py)
+add_upload_limit(app)
+
+# Per-route latency, SQL statements per request and slow query logging - opt in with METRICS_ENABLED=1,
+# METRICS_DEBUG_HEADERS=1 adds X-Query-Count / X-Query-Time to every response (see metrics.py)
+add_metrics(app)
+
+# Serializers for the big list endpoints (fast_json - one validation, Rust serialization with FAST_JSON=1)
+student_list_json = TypeAdapter(list[StudentSchema])
+test_list_json = TypeAdapter(list[CareerTestSchema])
+test_summary_list_json = TypeAdapter(list[CareerTestSummarySchema])
+test_json = TypeAdapter(CareerTestSchema)
+
+# Protected routes authenticate through this; with AUTH_REQUIRED=1 a Bearer token from /login is mandatory
+admin_only = [Depends(require_admin)]
+
 # Sample GET endpoint for homepage (optional)
 @app.get("/homepage")
 def get_homepage_data():
@@ -51,23 +127,11 @@ def get_homepage_data():
 
 
 
-# Create request body model
-class StudentCreate(BaseModel):
-    first_name: str
-    last_name: str
-    grade: str
-    email: str
-    country: str
-    phone: str
-    password: str
-
-@app.post("/register")
-def register_student(student: StudentCreate):   # ✅ Expect full JSON body
-    session = SessionLocal()
-    existing_student = session.query(Student).filter(Student.email == student.email).first()
+@app.post("/register", dependencies=[limit_by_ip("register_ip")])
+async def register_student(student: StudentCreate, db: AsyncSession = Depends(get_async_write_db)):   # ✅ Expect full JSON body
+    existing_student = (await db.execute(select(Student.id).where(Student.email == student.email))).first()
 
     if existing_student:
-        session.close()
         raise HTTPException(status_code=400, detail="Email already registered.")
 
     new_student = Student(
@@ -77,12 +141,16 @@ def register_student(student: StudentCreate):   # ✅ Expect full JSON body
         email=student.email,
         country=student.country,
         phone=student.phone,
-        password=student.password  # we will hash it later
+        password=await hash_password(student.password)  # scrypt, hashed in the worker pool
     )
 
-    session.add(new_student)
-    session.commit()
-    session.close()
+    db.add(new_student)
+    await db.run_sync(count_new_students, [new_student])     # dashboard rollup, same transaction
+    try:
+        await db.commit()
+    except IntegrityError:      # same email registered concurrently
+        await db.rollback()
+        raise HTTPException(status_code=400, detail="Email already registered.")
 
     return {"message": "Student registered successfully!"}
 
@@ -96,24 +164,41 @@ class LoginRequest(BaseModel):
     email: str
     password: str
 
-@app.post("/login")
-def login(credentials: LoginRequest):           #Use a Pydantic model to parse JSON POST request body from react
+# Token buckets per client IP and per account (see ratelimit.py) - past them /login answers 429 without touching the DB
+def limit_login_email(credentials: LoginRequest):
+    limiter.enforce("login_email", credentials.email.strip().lower())
+
+@app.post("/login", dependencies=[limit_by_ip("login_ip"), Depends(limit_login_email)])
+async def login(credentials: LoginRequest, db: AsyncSession = Depends(get_async_db)):   #Use a Pydantic model to parse JSON POST request body from react
     email = credentials.email
     password = credentials.password
 
-    session = SessionLocal()
-
-    student = session.query(Student).filter(Student.email == email).first()
-    if student and student.password == password:
-        session.close()
-        return {"role": "student", "message": "Student login successful"}
-
-    admin = session.query(Admin).filter(Admin.email == email).first()
-    if admin and admin.password == password:
-        session.close()
-        return {"role": "admin", "message": "Admin login successful"}
+    # Students and admins in one round trip - both lookups hit the unique email indexes
+    accounts = union_all(
+        select(Student.id, Student.password, literal("student").label("role"), Student.premium).where(Student.email == email),
+        select(Admin.id, Admin.password, literal("admin").label("role"), literal(False).label("premium")).where(Admin.email == email),
+    )
+    rows = (await db.execute(accounts)).all()
+
+    if not rows:
+        await verify_password(password, DUMMY_HASH)     # same cost as a real attempt, so emails can't be probed by timing
+
+    for account_id, stored, role, premium in sorted(rows, key=lambda r: r.role != "student"):   # student first, like before
+        if await verify_password(password, stored):
+            if not is_hashed(stored):
+                # Plaintext password from before hashing - upgrade it now that we know it
+                model = Student if role == "student" else Admin
+                await db.execute(update(model).where(model.id == account_id).values(password=await hash_password(password)))
+                await db.commit()
+            # Token for the Authorization header from now on; the principal is cached so the next requests skip the DB
+            principal_cache.put(Principal(id=account_id, role=role, premium=bool(premium)))
+            return {
+                "role": role,
+                "message": f"{role.capitalize()} login successful",
+                "access_token": create_token(account_id, role),
+                "token_type": "bearer",
+            }
 
-    session.close()
     raise HTTPException(status_code=401, detail="Invalid email or password")
 
 
@@ -127,28 +212,30 @@ def login(credentials: LoginRequest):           #Use a Pydantic model to parse J
 
 #Reorder this over admin/id get request else it mistakes admin/students as admin/id
 #SQLAlchemy returns ORM objects, not json serializable but FastAPI expects dict/list of primitives so we manually build a list of dict result
-@app.get("/admin/students", response_model=list[StudentSchema])
+#Paged with a keyset cursor: pass the X-Next-Cursor header of one page as ?cursor= to get the next one
+@app.get("/admin/students", response_model=list[StudentSchema], dependencies=admin_only)
 def get_all_students(
-    search: str = Query("", description="Search string"),
+    search: str = Query("", description="Prefix search over first name, last name and email"),
     sort_by: str = Query("id", enum=["id", "first_name", "last_name", "grade", "country", "email"]),
-    order: str = Query("asc", enum=["asc", "desc"])
+    order: str = Query("asc", enum=["asc", "desc"]),
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor value from the previous page"),
+    db: Session = Depends(get_db)
 ):
-    session = SessionLocal()
-    query = session.query(Student)
+    try:
+        students, next_cursor = get_students_page(db, search, sort_by, order, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-    if search:
-        query = query.filter(Student.first_name.contains(search))
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+    return fast_json(student_list_json, students, headers)   # StudentSchema (schemas.py) reads the ORM objects directly
 
-    sort_column = getattr(Student, sort_by)
-    if order == "desc":
-        query = query.order_by(sort_column.desc())
-    else:
-        query = query.order_by(sort_column.asc())
 
-    students = query.all()
-    session.close()
-    return students   # FastAPI will automatically serialize SQLAlchemy models into Pydantic models because of orm_mode=True
-                      # Instead of serializing here itself, i put that in the schemas.py
+# Dashboard breakdowns (per grade, per country, premium vs free, tests taken) from the student_stats
+# rollup - one row per group instead of the whole student list
+@app.get("/admin/students/stats", dependencies=admin_only)
+def get_all_student_stats(db: Session = Depends(get_db)):
+    return get_student_stats(db)
 
 
 
@@ -161,14 +248,6 @@ def get_all_students(
 
 
 
-# Dependency
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 # @app.post("/admin/tests/create", response_model=CareerTestSchema)
 # def create_career_test(test_data: CareerTestCreateSchema, db: Session = Depends(get_db)):
 #     new_test = CareerTest(
@@ -189,53 +268,62 @@ def get_db():
 
 
 
-@app.post("/admin/tests/create", response_model=CareerTestSchema)
-def create_career_test(test: CareerTestCreateSchema, db: Session = Depends(get_db)):
+@app.post("/admin/tests/create", response_model=CareerTestSchema, dependencies=admin_only)
+def create_career_test(test: CareerTestCreateSchema, db: Session = Depends(get_write_db)):
     new_test = CareerTest(
         name=test.name,
         description=test.description,
-        number_of_questions=test.number_of_questions,
         last_updated=datetime.utcnow()
     )
     db.add(new_test)
-    db.commit()
-    db.refresh(new_test)
-
-    # Save questions
-    for q in test.questions:
-        new_question = Question(
-            test_id=new_test.id,
-            description=q.description,
-            tag=q.tag
-        )
-        db.add(new_question)
+    db.flush()      # assigns new_test.id without committing
 
-    db.commit()
-    return CareerTestSchema.model_validate(new_test, from_attributes=True)
+    # Save questions (number_of_questions and the per-tag counts are recounted from them)
+    bulk_insert_questions(db, new_test.id, test.questions)
 
+    db.commit()     # test + questions in one transaction
+    return fast_json(test_json, new_test)
 
 
 
 
-@app.get("/admin/tests", response_model=list[CareerTestSchema])
-def get_all_tests(db: Session = Depends(get_db)):
-    tests = db.query(CareerTest).all()
-    return [CareerTestSchema.model_validate(t, from_attributes=True) for t in tests]
 
+# subqueryload fetches the questions of all tests in one extra SELECT (joined to the tests query)
+# instead of one lazy load per test while serializing - selectinload would split its IN (...) list
+# every 500 tests, so the count would still creep up. fields=summary skips the questions entirely.
+@app.get("/admin/tests", response_model=list[CareerTestSchema] | list[CareerTestSummarySchema], dependencies=admin_only)
+def get_all_tests(
+    fields: str = Query("full", enum=["full", "summary"]),
+    db: Session = Depends(get_db)
+):
+    if fields == "summary":
+        rows = db.query(CareerTest.id, CareerTest.name, CareerTest.number_of_questions, CareerTest.last_updated).all()
+        return fast_json(test_summary_list_json, rows)
 
+    tests = db.query(CareerTest).options(subqueryload(CareerTest.questions)).all()
+    return fast_json(test_list_json, tests)
 
 
 
-@app.get("/admin/tests/{test_id}", response_model=CareerTestSchema)
+
+
+# Question totals per test and per RIASEC tag, read from the counter columns on career_tests.
+# Declared before /admin/tests/{test_id}
+@app.get("/admin/tests/stats", dependencies=admin_only)
+def get_career_test_stats(db: Session = Depends(get_db)):
+    return get_test_stats(db)
+
+
+@app.get("/admin/tests/{test_id}", response_model=CareerTestSchema, dependencies=admin_only)
 def get_test(test_id: int, db: Session = Depends(get_db)):
-    test = db.query(CareerTest).filter(CareerTest.id == test_id).first()
+    test = db.query(CareerTest).options(selectinload(CareerTest.questions)).filter(CareerTest.id == test_id).first()
     if not test:
         raise HTTPException(status_code=404, detail="Test not found")
-    return CareerTestSchema.model_validate(test, from_attributes=True) # return CareerTestSchema.model_validate(test)
+    return fast_json(test_json, test)
 
 
-@app.put("/admin/tests/{test_id}/update", response_model=CareerTestSchema)
-def update_career_test(test_id: int, updated_data: CareerTestUpdateSchema, db: Session = Depends(get_db)):
+@app.put("/admin/tests/{test_id}/update", response_model=CareerTestSchema, dependencies=admin_only)
+def update_career_test(test_id: int, updated_data: CareerTestUpdateSchema, db: Session = Depends(get_write_db)):
     test = db.query(CareerTest).filter(CareerTest.id == test_id).first()
     if not test:
         raise HTTPException(status_code=404, detail="Test not found")
@@ -243,38 +331,56 @@ def update_career_test(test_id: int, updated_data: CareerTestUpdateSchema, db: S
     # Update test fields
     test.name = updated_data.name
     test.description = updated_data.description
-    test.number_of_questions = updated_data.number_of_questions
     test.last_updated = datetime.utcnow()
 
-    # Clear existing questions
-    test.questions.clear()
-
-    # Add new questions
-    for q in updated_data.questions:
-        question = Question(description=q.description, tag=q.tag)
-        test.questions.append(question)
+    # Only insert / update / delete the questions that changed
+    sync_questions(db, test.id, updated_data.questions)
 
     db.commit()
     db.refresh(test)
-    return CareerTestSchema.model_validate(test, from_attributes=True)
+    queue_rescore(test_id, SessionLocal)     # stored results follow the edited questions, see scoring.py
+    return fast_json(test_json, test)
 
 
 
-@app.post("/admin/tests/{test_id}/duplicate")
-def duplicate_test(test_id: int, payload: CareerTestUpdateSchema, db: Session = Depends(get_db)):
-    new_test = CareerTest(
-        name=payload.name + " (Copy)",
-        description=payload.description,
-        number_of_questions=payload.number_of_questions,
-        last_updated=datetime.utcnow()
-    )
-    db.add(new_test)
-    db.commit()
-    db.refresh(new_test)
+COPY_NAME_ATTEMPTS = 5
+
+# Without a body the stored test is copied server side (questions via INSERT ... SELECT),
+# with a body the copy is built from the edited version the client sent, like before
+@app.post("/admin/tests/{test_id}/duplicate", dependencies=admin_only)
+def duplicate_test(test_id: int, payload: Optional[CareerTestUpdateSchema] = None, db: Session = Depends(get_write_db)):
+    if payload is None:
+        source = db.get(CareerTest, test_id)
+        if not source:
+            raise HTTPException(status_code=404, detail="Test not found")
+        name, description = source.name, source.description
+    else:
+        name, description = payload.name, payload.description
+
+    # Concurrent copies of one test race for the same "(Copy N)" name: the loser's insert is undone
+    # with its savepoint and it moves on to the next number
+    tried = []
+    for _ in range(COPY_NAME_ATTEMPTS):
+        new_test = CareerTest(
+            name=copy_name(db, name, tried),
+            description=description,
+            last_updated=datetime.utcnow()
+        )
+        try:
+            with begin_savepoint(db):
+                db.add(new_test)
+                db.flush()
+            break
+        except IntegrityError:
+            tried.append(new_test.name)
+    else:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="A test with this name already exists, try again")
 
-    for q in payload.questions:
-        new_q = Question(description=q.description, tag=q.tag, test_id=new_test.id)
-        db.add(new_q)
+    if payload is None:
+        copy_questions(db, test_id, new_test.id)
+    else:
+        bulk_insert_questions(db, new_test.id, payload.questions)
 
     db.commit()
     return {"message": "New test version created", "new_test_id": new_test.id }
@@ -290,12 +396,113 @@ def duplicate_test(test_id: int, payload: CareerTestUpdateSchema, db: Session =
 
 
 
+# Student submits a career test - scored with the compiled tag matrix (see scoring.py)
+# A student's token decides whose result it is; student_id in the body is only used by admins, or
+# by clients without a token while AUTH_REQUIRED=0
+@app.post("/tests/{test_id}/submit", response_model=TestResultSchema)
+def submit_career_test(
+    test_id: int,
+    submission: TestSubmissionCreate,
+    principal: Optional[Principal] = Depends(get_optional_principal),
+    db: Session = Depends(get_write_db)
+):
+    student_id = submission.student_id
+    if principal and principal.role == "student":
+        if student_id not in (None, principal.id):
+            raise HTTPException(status_code=403, detail="Students can only submit their own tests")
+        student_id = principal.id
+    if student_id is None:
+        raise HTTPException(status_code=400, detail="student_id is required")
+
+    try:
+        result, scores = submit_answers(db, test_id, student_id, submission.answers)
+    except LookupError as e:
+        db.rollback()
+        raise HTTPException(status_code=404, detail=str(e))
+    db.commit()
+
+    return {
+        "submission_id": result.id,
+        "test_id": test_id,
+        "scores": {letter: float(score) for letter, score in zip(RIASEC, scores)},
+        "top_code": result.top_code,
+    }
+
+
+# Re-score every stored submission of a test (also runs in the background after a test is edited)
+@app.post("/admin/tests/{test_id}/rescore", dependencies=admin_only)
+def rescore_career_test(test_id: int, db: Session = Depends(get_write_db)):
+    if not db.get(CareerTest, test_id):
+        raise HTTPException(status_code=404, detail="Test not found")
+    rescored = rescore_test(db, test_id)
+    db.commit()
+    return {"message": "Submissions rescored", "rescored": rescored}
+
+
+
+
+# Bulk onboarding: CSV or JSONL uploads, validated row by row, inserted in chunked transactions.
+# The response lists the rows that were rejected and why.
+@app.post("/admin/import/students", dependencies=admin_only)
+def import_students_file(
+    file: UploadFile = File(...),
+    format: Optional[str] = Query(None, enum=["csv", "jsonl"], description="Defaults to the file extension"),
+    db: Session = Depends(get_write_db)
+):
+    return import_students(db, file.file, detect_format(file.filename, format))
+
+
+@app.post("/admin/import/tests", dependencies=admin_only)
+def import_tests_file(
+    file: UploadFile = File(...),
+    format: Optional[str] = Query(None, enum=["csv", "jsonl"], description="Defaults to the file extension"),
+    db: Session = Depends(get_write_db)
+):
+    return import_tests(db, file.file, detect_format(file.filename, format))
+
+
+EXPORT_MEDIA_TYPES = {"csv": "text/csv", "jsonl": "application/x-ndjson"}
+
+@app.get("/admin/export/students", dependencies=admin_only)
+def export_students_file(format: str = Query("csv", enum=["csv", "jsonl"])):
+    return StreamingResponse(
+        export_students(SessionLocal, format), media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f"attachment; filename=students.{format}"}
+    )
+
+
+@app.get("/admin/export/tests", dependencies=admin_only)
+def export_tests_file(format: str = Query("jsonl", enum=["csv", "jsonl"])):
+    return StreamingResponse(
+        export_tests(SessionLocal, format), media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f"attachment; filename=tests.{format}"}
+    )
+
+
+
+
+# Auth cache counters
+@app.get("/auth/cache-stats", dependencies=admin_only)
+def get_auth_cache_stats():
+    return principal_cache.stats()
+
+
+
+
+# Prometheus scrape endpoint
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled (METRICS_ENABLED=1)")
+    return Response(content=registry.render(), media_type="text/plain; version=0.0.4")
+
+
+
+
 # Fetch admin data
-@app.get("/admin/{admin_id}")
-def get_admin_profile(admin_id: int):
-    session = SessionLocal()
-    admin = session.query(Admin).filter(Admin.id == admin_id).first()
-    session.close()
+@app.get("/admin/{admin_id}", dependencies=admin_only)
+def get_admin_profile(admin_id: int, db: Session = Depends(get_db)):
+    admin = db.query(Admin).filter(Admin.id == admin_id).first()
     if not admin:
         raise HTTPException(status_code=404, detail="Admin not found")
     return {
@@ -308,12 +515,10 @@ def get_admin_profile(admin_id: int):
     }
 
 # Update admin profile (except email)
-@app.put("/admin/{admin_id}")
-def update_admin_profile(admin_id: int, data: dict):
-    session = SessionLocal()
-    admin = session.query(Admin).filter(Admin.id == admin_id).first()
+@app.put("/admin/{admin_id}", dependencies=admin_only)
+def update_admin_profile(admin_id: int, data: dict, db: Session = Depends(get_write_db)):
+    admin = db.query(Admin).filter(Admin.id == admin_id).first()
     if not admin:
-        session.close()
         raise HTTPException(status_code=404, detail="Admin not found")
 
     # Only allow updates to fields other than email
@@ -322,34 +527,39 @@ def update_admin_profile(admin_id: int, data: dict):
     admin.country = data.get("country", admin.country)
     admin.phone = data.get("phone", admin.phone)
 
-    session.commit()
-    session.close()
+    db.commit()
+    invalidate_principal("admin", admin_id)
     return {"message": "Admin profile updated successfully"}
 
 
 
 
-UPLOAD_DIR = "uploads"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
-app.mount("/uploads", StaticFiles(directory=UPLOAD_DIR), name="uploads")
+app.mount("/uploads", UploadFiles(directory=UPLOAD_DIR), name="uploads")
 
 
+def discard_upload(db: Session, thumbnail_url: Optional[str]):
+    """Roll back a page write that failed and remove the file stored for it - unless another page
+    uses the same image (uploads are content addressed, so identical files are shared)."""
+    db.rollback()
+    if thumbnail_url and not db.scalar(select(CareerPage.id).where(CareerPage.thumbnail_url == thumbnail_url).limit(1)):
+        delete_upload(thumbnail_url)
+
+
+# A plain def like update_career_page: the upload copy, flush, index and commit all run in the
+# threadpool, so a slow disk or a busy SQLite lock never holds up the event loop
 @app.post("/career-pages/upload", response_model=CareerPageOut)
-async def create_page(
+def create_page(
     title: str = Form(...),
     slug: str = Form(...),
     content: str = Form(...),
     riasec_tags: Optional[str] = Form(""),
     parent_id: Optional[int] = Form(None),
     thumbnail: Optional[UploadFile] = File(None),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_write_db)
 ):
     thumbnail_url = None
     if thumbnail:
-        file_location = f"uploads/{thumbnail.filename}"
-        with open(file_location, "wb") as f:
-            f.write(await thumbnail.read())
-        thumbnail_url = f"/{file_location}"
+        thumbnail_url = save_upload(thumbnail)      # chunked copy, see uploads.py
 
     # ✅ NO CareerPageCreate used here
     page = CareerPage(
@@ -357,13 +567,26 @@ async def create_page(
         slug=slug,
         content=content,
         riasec_tags=riasec_tags,
-        parent_id=parent_id,
+        riasec_mask=tags_to_mask(riasec_tags),
         thumbnail_url=thumbnail_url
     )
 
     db.add(page)
+    try:
+        db.flush()      # id is part of the page's own path
+        place_page(db, page, parent_id)
+    except (ValueError, IntegrityError) as e:
+        discard_upload(db, thumbnail_url)
+        if isinstance(e, IntegrityError):
+            raise HTTPException(status_code=409, detail="A page with this slug or title already exists")
+        raise HTTPException(status_code=400, detail=str(e))
+    index_page(db, page)    # search index, same transaction
     db.commit()
     db.refresh(page)
+    recommender.upsert(page)
+    career_page_cache.invalidate(("slug", page.slug))
+    if thumbnail_url:
+        queue_thumbnail(page.id, thumbnail_url, SessionLocal)       # resized variants, see thumbnails.py
     return page
 
 
@@ -371,19 +594,162 @@ async def create_page(
 
 
 
+# Career pages are read far more than written, so the serialized JSON is cached (see cache.py)
+# and sent with an ETag - a client / CDN revalidating an unchanged page gets a bodyless 304
+career_page_list_json = TypeAdapter(List[CareerPageOut])
+
+def career_page_list_body(db: Session) -> bytes:
+    # validated first: thumbnail_variant_url is computed on the schema, the ORM rows don't have it
+    return career_page_list_json.dump_json(career_page_list_json.validate_python(get_all_pages(db), from_attributes=True))
+
+# Cache hit rate for the career page responses
+@app.get("/cache-stats/career-pages", dependencies=admin_only)
+def get_career_page_cache_stats():
+    return career_page_cache.stats()
+
+
 # List all career pages
-@app.get("/career-pages", response_model=List[CareerPageOut])
-def get_all_career_pages(db: Session = Depends(get_db)):
-    return get_all_pages(db)
+# fields=summary is the light library index: no HTML content, optional parent_id filter and
+# keyset paging (limit + cursor, next cursor in X-Next-Cursor), streamed row by row
+@app.get("/career-pages", response_model=List[CareerPageOut] | List[CareerPageSummary])
+def get_all_career_pages(
+    request: Request,
+    fields: str = Query("full", enum=["full", "summary"]),
+    parent_id: Optional[int] = Query(None),
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    cursor: Optional[str] = Query(None),
+    thumb_width: int = Query(320, enum=list(VARIANT_WIDTHS), description="Width of thumbnail_variant_url in summary rows"),
+    db: Session = Depends(get_db)
+):
+    if fields == "summary":
+        return stream_page_summaries(db, parent_id, limit, cursor, thumb_width)
 
+    return cached_json_response(
+        request, career_page_cache, ("list", career_page_cache.version),
+        lambda: career_page_list_body(db)
+    )
 
-# Get a page by slug (for detail view)
-@app.get("/career-pages/{slug}", response_model=CareerPageOut)
-def get_page(slug: str, db: Session = Depends(get_db)):
-    db_page = get_page_by_slug(db, slug)
-    if not db_page:
+
+def stream_page_summaries(db: Session, parent_id: Optional[int], limit: Optional[int], cursor: Optional[str], thumb_width: int):
+    after_id = None
+    if cursor:
+        try:
+            after_id = decode_cursor(cursor)[1]
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    headers = {}
+    if limit is not None:
+        # One page is bounded by `limit`; reading one extra row tells us whether there is a next page
+        # before the headers go out
+        upcoming = list(iter_page_summaries(db, parent_id, after_id, limit + 1))
+        if len(upcoming) > limit:
+            headers["X-Next-Cursor"] = encode_cursor(upcoming[limit - 1]["id"], upcoming[limit - 1]["id"])
+        rows = iter(upcoming[:limit])
+    else:
+        rows = None
+
+    def generate():
+        # Own session for the unbounded stream: the request's get_db session may be closed while the body streams
+        stream_db = SessionLocal() if rows is None else None
+        try:
+            yield b"["
+            for i, row in enumerate(rows if rows is not None else iter_page_summaries(stream_db, parent_id, after_id)):
+                row["thumbnail_variant_url"] = variant_url(row["thumbnail_url"], row.pop("thumbnail_variants"), thumb_width)
+                yield (b"," if i else b"") + json.dumps(row).encode()
+            yield b"]"
+        finally:
+            if stream_db:
+                stream_db.close()
+
+    return StreamingResponse(generate(), media_type="application/json", headers=headers)
+
+
+# Rank every career page against a student's RIASEC scores (cosine similarity, see riasec.py)
+# e.g. /career-pages/recommend?profile=R:0.9,I:0.7,S:0.2 - declared before /{slug} so it isn't taken as a slug
+@app.get("/career-pages/recommend")
+def recommend_career_pages(
+    profile: str = Query(..., description="R:0.9,I:0.7,... or six scores in R,I,A,S,E,C order"),
+    limit: int = Query(10, ge=1, le=100),
+    db: Session = Depends(get_db)
+):
+    try:
+        vector = parse_profile(profile)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return recommender.recommend(db, vector, limit)
+
+
+# Search titles and page text, best matches first, e.g. /career-pages/search?q=data+science
+# Each row has a short excerpt with the matched words in <mark>; next page via the X-Next-Cursor header
+@app.get("/career-pages/search")
+def search_career_pages(
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None),
+    db: Session = Depends(get_db)
+):
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    results = search_pages(db, q, limit + 1, after)
+    if len(results) > limit:
+        results = results[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(results[-1]["score"], results[-1]["id"])
+    return results
+
+
+# Library tree (optionally only below ?root=<slug>) - one query over the materialized path
+@app.get("/career-pages/tree")
+def get_career_page_tree(root: Optional[str] = Query(None), db: Session = Depends(get_db)):
+    root_path = None
+    if root:
+        root_path = db.execute(select(CareerPage.path).where(CareerPage.slug == root)).scalar()
+        if not root_path:
+            raise HTTPException(status_code=404, detail="Page not found.")
+    return get_tree(db, root_path)
+
+
+# Breadcrumbs, root first
+@app.get("/career-pages/{slug}/ancestors")
+def get_career_page_ancestors(slug: str, db: Session = Depends(get_db)):
+    page = db.execute(select(CareerPage.id, CareerPage.path).where(CareerPage.slug == slug)).first()
+    if not page:
         raise HTTPException(status_code=404, detail="Page not found.")
-    return db_page
+    return get_ancestors(db, page)
+
+
+# Resized thumbnails (/thumbnails/<hash>-320.webp). Normally made by the background job after an upload;
+# a missing one is made on the spot and kept. Without Pillow this falls back to the original image.
+@app.get("/thumbnails/{name}")
+def get_thumbnail(name: str):
+    match = re.fullmatch(r"([A-Za-z0-9_-]+)-(\d+)\.(webp|jpg)", name)
+    if not match:
+        raise HTTPException(status_code=404, detail="Not found")
+    stem, width = match.group(1), int(match.group(2))
+
+    path = os.path.join(VARIANT_DIR, name)
+    if not os.path.exists(path) and not generate_variant(stem, width):
+        original = find_original(stem)
+        if not original:
+            raise HTTPException(status_code=404, detail="Not found")
+        return RedirectResponse(f"/uploads/{os.path.basename(original)}")
+    return FileResponse(path, headers={"Cache-Control": cache_control_for(name)})
+
+
+# Get a page by slug (for detail view). Concurrent misses for the same slug share one query (single-flight in cache.py)
+@app.get("/career-pages/{slug}", response_model=CareerPageOut, dependencies=[limit_by_ip("page_ip")])
+def get_page(slug: str, request: Request, db: Session = Depends(get_db)):
+    def build():
+        db_page = get_page_by_slug(db, slug)
+        if not db_page:
+            raise HTTPException(status_code=404, detail="Page not found.")
+        return CareerPageOut.model_validate(db_page).model_dump_json().encode()
+
+    return cached_json_response(request, career_page_cache, ("slug", slug), build)
 
 @app.put("/career-pages/{slug}/update")
 def update_career_page(
@@ -394,7 +760,7 @@ def update_career_page(
     content: str = Form(...),
     parent_id: Optional[int] = Form(None),
     thumbnail: Optional[UploadFile] = File(None),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_write_db)
 ):
     page = db.query(CareerPage).filter(CareerPage.slug == slug).first()
     if not page:
@@ -402,21 +768,33 @@ def update_career_page(
 
     page.title = title
     page.riasec_tags = riasec_tags
+    page.riasec_mask = tags_to_mask(riasec_tags)
     page.content = content
-    page.parent_id = parent_id
+    try:
+        place_page(db, page, parent_id)     # re-parenting moves the whole subtree, cycles are rejected
+    except ValueError as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
 
     if slug_new:
         page.slug = slug_new
 
+    new_thumbnail_url = None
     if thumbnail:
-        filename = f"{uuid4().hex}_{thumbnail.filename}"
-        file_location = f"static/uploads/{filename}"
-        with open(file_location, "wb+") as file_object:
-            file_object.write(thumbnail.file.read())
-        page.thumbnail_url = f"/uploads/{filename}"
+        page.thumbnail_url = new_thumbnail_url = save_upload(thumbnail)        # sync route, already off the event loop
+        page.thumbnail_variants = None
 
-    db.commit()
+    try:
+        index_page(db, page)
+        db.commit()
+    except IntegrityError:
+        discard_upload(db, new_thumbnail_url)
+        raise HTTPException(status_code=409, detail="A page with this slug or title already exists")
     db.refresh(page)
+    recommender.upsert(page)
+    career_page_cache.invalidate(("slug", slug), ("slug", page.slug))
+    if thumbnail:
+        queue_thumbnail(page.id, page.thumbnail_url, SessionLocal)
     return page
 
 
@@ -438,4 +816,4 @@ def update_career_page(
 
 
 if __name__ == "__main__":
-    Base.metadata.create_all(bind=engine)
+    run_migrations(engine, log=print)
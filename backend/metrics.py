@@ -0,0 +1,184 @@
+# metrics.py - Opt-in request / SQL instrumentation, exported at /metrics in Prometheus text format
+import os, time, logging, threading
+from contextvars import ContextVar
+from typing import Optional
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "0") == "1"
+METRICS_DEBUG_HEADERS = os.getenv("METRICS_DEBUG_HEADERS", "0") == "1"     # X-Query-Count / X-Query-Time on every response
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)     # seconds
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)      # statements per request - N+1s land in the top buckets
+
+slow_query_log = logging.getLogger("sql.slow")
+
+
+class RequestStats:
+    __slots__ = ("queries", "query_time")
+
+    def __init__(self):
+        self.queries = 0
+        self.query_time = 0.0
+
+# Stats of the request being handled. The threadpool copies the context into sync routes, and the
+# object is mutated in place, so queries made from a worker thread still count for their request.
+current_request: ContextVar[Optional[RequestStats]] = ContextVar("current_request", default=None)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = {}          # (method, route, status) -> count
+        self.latency = {}           # route -> Histogram
+        self.queries = {}           # route -> Histogram of statements per request
+        self.query_time = {}        # route -> seconds spent in SQL
+        self.background_queries = 0             # statements outside any request (background tasks, startup)
+        self.background_query_time = 0.0
+        self.slow_queries = 0
+
+    def record_request(self, method: str, route: str, status: int, elapsed: float, stats: RequestStats):
+        with self.lock:
+            key = (method, route, status)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            self.latency.setdefault(route, Histogram(LATENCY_BUCKETS)).observe(elapsed)
+            self.queries.setdefault(route, Histogram(QUERY_COUNT_BUCKETS)).observe(stats.queries)
+            self.query_time[route] = self.query_time.get(route, 0.0) + stats.query_time
+
+    def record_background_query(self, elapsed: float):
+        with self.lock:
+            self.background_queries += 1
+            self.background_query_time += elapsed
+
+    def render(self) -> str:
+        with self.lock:
+            lines = []
+            lines += ["# HELP http_requests_total Requests handled, by route and status.", "# TYPE http_requests_total counter"]
+            for (method, route, status), count in sorted(self.requests.items()):
+                lines.append(f'http_requests_total{{method="{method}",route="{_escape(route)}",status="{status}"}} {count}')
+
+            lines += _histogram_lines("http_request_duration_seconds", "Request latency by route.", self.latency)
+            lines += _histogram_lines("sql_queries_per_request", "SQL statements executed per request.", self.queries)
+
+            lines += ["# HELP sql_query_seconds_total Time spent in SQL, by route.", "# TYPE sql_query_seconds_total counter"]
+            for route, seconds in sorted(self.query_time.items()):
+                lines.append(f'sql_query_seconds_total{{route="{_escape(route)}"}} {seconds:.6f}')
+            lines.append(f'sql_query_seconds_total{{route="background"}} {self.background_query_time:.6f}')
+
+            lines += ["# HELP sql_background_queries_total SQL statements run outside a request.", "# TYPE sql_background_queries_total counter"]
+            lines.append(f"sql_background_queries_total {self.background_queries}")
+            lines += [f"# HELP sql_slow_queries_total Statements slower than {SLOW_QUERY_MS:g} ms.", "# TYPE sql_slow_queries_total counter"]
+            lines.append(f"sql_slow_queries_total {self.slow_queries}")
+            return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _histogram_lines(name: str, help_text: str, histograms: dict) -> list:
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    for route, histogram in sorted(histograms.items()):
+        label = f'route="{_escape(route)}"'
+        cumulative = 0
+        for bound, count in zip(histogram.buckets, histogram.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{label},le="{bound:g}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{label},le="+Inf"}} {histogram.count}')
+        lines.append(f"{name}_sum{{{label}}} {histogram.sum:.6f}")
+        lines.append(f"{name}_count{{{label}}} {histogram.count}")
+    return lines
+
+
+# SQL: listening on the Engine class covers the shared engine and the async one database.py
+# creates lazily (its events fire on async_engine.sync_engine)
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    stats = current_request.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.query_time += elapsed
+    else:
+        registry.record_background_query(elapsed)
+
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        with registry.lock:
+            registry.slow_queries += 1
+        shown = parameters if not executemany else f"{len(parameters)} parameter sets, first: {parameters[:1]}"
+        slow_query_log.warning("slow query (%.1f ms): %s | params: %s", elapsed * 1000, statement, shown)
+
+_instrumented = False
+
+def instrument_sql():
+    global _instrumented
+    if not _instrumented:
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+        _instrumented = True
+
+
+class MetricsMiddleware:
+    """Plain ASGI middleware (no BaseHTTPMiddleware) so streamed responses pass straight through.
+    Latency is measured to the end of the body; the debug headers can only count the queries made
+    before the headers went out, which for a streamed body is the part before the first chunk."""
+
+    def __init__(self, app, debug_headers: bool = METRICS_DEBUG_HEADERS):
+        self.app = app
+        self.debug_headers = debug_headers
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        stats = RequestStats()
+        token = current_request.set(stats)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_stats(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if self.debug_headers:
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (b"x-query-count", str(stats.queries).encode()),
+                        (b"x-query-time", f"{stats.query_time * 1000:.2f}ms".encode()),
+                    ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_stats)
+        finally:
+            current_request.reset(token)
+            route = scope.get("route")
+            # the route template (/career-pages/{slug}), never the raw path, keeps the label set bounded
+            registry.record_request(
+                scope["method"], getattr(route, "path", "unmatched"), status, time.perf_counter() - start, stats
+            )
+
+
+def add_metrics(app):
+    if METRICS_ENABLED or METRICS_DEBUG_HEADERS:
+        instrument_sql()
+        app.add_middleware(MetricsMiddleware)
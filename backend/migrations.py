@@ -0,0 +1,130 @@
+# migrations.py - Versioned schema migrations, recorded in the schema_migrations table
+#
+#   python migrations.py                 apply pending migrations to DATABASE_URL (or --url sqlite:///./other.db)
+#   python migrations.py status          list applied / pending versions
+#
+# With several workers (uvicorn --workers N) run this once before starting them and set
+# MIGRATE_ON_STARTUP=0. Workers that do migrate on startup take turns through migration_lock().
+import os, time, hashlib, argparse, tempfile
+from contextlib import contextmanager
+from sqlalchemy import text, create_engine
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from models import Base
+from search import setup_student_search, setup_page_search
+from riasec import migrate_riasec_mask
+from hierarchy import migrate_page_paths
+from thumbnails import migrate_thumbnail_variants
+from crud import migrate_question_counts
+from analytics import migrate_student_stats
+
+
+def create_tables(engine: Engine):
+    Base.metadata.create_all(bind=engine)       # only creates what is missing; columns come from the ones below
+
+
+# Append only - a version, once released, never changes meaning. Every step is safe to re-run
+# against a database that already has it (databases from before this table existed start at 0).
+MIGRATIONS = [
+    (1, "create missing tables", create_tables),
+    (2, "student sort indexes and full-text search", setup_student_search),
+    (3, "career_pages.riasec_mask", migrate_riasec_mask),
+    (4, "career_pages.path / depth", migrate_page_paths),
+    (5, "career_pages.thumbnail_variants", migrate_thumbnail_variants),
+    (6, "career page full-text search", setup_page_search),
+    (7, "server-side question counts per test and tag", migrate_question_counts),
+    (8, "student_stats rollup", migrate_student_stats),
+]
+
+SCHEMA_MIGRATIONS_DDL = """
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version INTEGER PRIMARY KEY,
+    description VARCHAR(200) NOT NULL,
+    applied_at FLOAT NOT NULL
+)
+"""
+
+
+def applied_versions(engine: Engine) -> set:
+    with engine.begin() as conn:
+        conn.execute(text(SCHEMA_MIGRATIONS_DDL))
+        return set(conn.execute(text("SELECT version FROM schema_migrations")).scalars())
+
+
+def pending_migrations(engine: Engine) -> list:
+    done = applied_versions(engine)
+    return [m for m in MIGRATIONS if m[0] not in done]
+
+
+try:
+    import fcntl
+except ImportError:     # Windows - no cross-process lock, run migrations.py before starting the workers
+    fcntl = None
+
+@contextmanager
+def migration_lock(engine: Engine):
+    """One migrating process at a time: a PostgreSQL advisory lock, or an flock()ed file elsewhere."""
+    if engine.dialect.name == "postgresql":
+        with engine.connect() as conn:
+            conn.execute(text("SELECT pg_advisory_lock(hashtext('career_migrations'))"))
+            try:
+                yield
+            finally:
+                conn.execute(text("SELECT pg_advisory_unlock(hashtext('career_migrations'))"))
+        return
+
+    if fcntl is None:
+        yield
+        return
+    key = hashlib.sha256(str(engine.url).encode()).hexdigest()[:16]
+    with open(os.path.join(tempfile.gettempdir(), f"career-migrations-{key}.lock"), "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def run_migrations(engine: Engine, log=None) -> list:
+    """Apply pending migrations in order; a database that is up to date costs one SELECT."""
+    if not pending_migrations(engine):
+        return []
+    with migration_lock(engine):
+        return _apply_pending(engine, log)      # re-checked under the lock - another worker may have done it
+
+
+def _apply_pending(engine: Engine, log) -> list:
+    applied = []
+    for version, description, migrate in pending_migrations(engine):
+        started = time.perf_counter()
+        migrate(engine)
+        try:
+            with engine.begin() as conn:
+                conn.execute(
+                    text("INSERT INTO schema_migrations (version, description, applied_at) VALUES (:v, :d, :t)"),
+                    {"v": version, "d": description, "t": time.time()}
+                )
+        except IntegrityError:
+            pass        # another process applied it at the same time
+        if log:
+            log(f"applied {version}: {description} ({(time.perf_counter() - started) * 1000:.0f} ms)")
+        applied.append(version)
+    return applied
+
+
+if __name__ == "__main__":
+    from database import DATABASE_URL, setup_engine, pool_options
+
+    parser = argparse.ArgumentParser(description="Apply schema migrations")
+    parser.add_argument("command", nargs="?", default="upgrade", choices=["upgrade", "status"])
+    parser.add_argument("--url", default=DATABASE_URL)
+    args = parser.parse_args()
+
+    target = setup_engine(create_engine(args.url, **pool_options(args.url)))
+    if args.command == "status":
+        done = applied_versions(target)
+        for version, description, _ in MIGRATIONS:
+            print(f"{version:>4}  {'applied' if version in done else 'pending'}  {description}")
+    else:
+        applied = run_migrations(target, log=print)
+        print(f"{len(applied)} migration(s) applied" if applied else "Database is up to date")
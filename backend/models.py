@@ -1,5 +1,5 @@
 # models.py
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text, LargeBinary
 from datetime import datetime
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy import create_engine
@@ -12,16 +12,26 @@ class Student(Base):
     __tablename__ = "students"
 
     id = Column(Integer, primary_key=True, index=True)
-    first_name = Column(String)
-    last_name = Column(String)
-    grade = Column(String)
+    first_name = Column(String, index=True)     # sort_by columns are indexed for keyset paging on /admin/students,
+    last_name = Column(String, index=True)      # sqlite keeps the rowid (id) in every index so (col, id) is covered
+    grade = Column(String, index=True)
     email = Column(String, unique=True, index=True) 
-    country = Column(String)
+    country = Column(String, index=True)
     phone = Column(String)
     password = Column(String)  # hashed
     premium = Column(Boolean, default=False)
     career_test_count = Column(Integer, default=0)
 
+# Rollup behind GET /admin/students/stats - one row per (grade, country, premium) group, see analytics.py
+class StudentStats(Base):
+    __tablename__ = "student_stats"
+
+    grade = Column(String, primary_key=True, default="")       # "" = not given
+    country = Column(String, primary_key=True, default="")
+    premium = Column(Boolean, primary_key=True, default=False)
+    students = Column(Integer, nullable=False, default=0)
+    career_tests_taken = Column(Integer, nullable=False, default=0)
+
 class Admin(Base):
     __tablename__ = "admins"
 
@@ -44,7 +54,14 @@ class CareerTest(Base):
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, unique=True, nullable=False)
     description = Column(String, nullable=False)
-    number_of_questions = Column(Integer, default=0)
+    number_of_questions = Column(Integer, default=0)  # counted by the server, see crud.refresh_question_counts
+    # Questions per RIASEC tag, kept alongside number_of_questions
+    questions_r = Column(Integer, nullable=False, default=0, server_default="0")
+    questions_i = Column(Integer, nullable=False, default=0, server_default="0")
+    questions_a = Column(Integer, nullable=False, default=0, server_default="0")
+    questions_s = Column(Integer, nullable=False, default=0, server_default="0")
+    questions_e = Column(Integer, nullable=False, default=0, server_default="0")
+    questions_c = Column(Integer, nullable=False, default=0, server_default="0")
     last_updated = Column(DateTime, default=datetime.utcnow)
 
     questions = relationship("Question", back_populates="test", cascade="all, delete-orphan")
@@ -52,12 +69,22 @@ class CareerTest(Base):
 class Question(Base):
     __tablename__ = "questions"
     id = Column(Integer, primary_key=True, index=True)
-    test_id = Column(Integer, ForeignKey("career_tests.id"))
+    test_id = Column(Integer, ForeignKey("career_tests.id"), index=True)
     description = Column(String)
     tag = Column(String)
 
     test = relationship("CareerTest", back_populates="questions")
 
+class TestSubmission(Base):
+    __tablename__ = "test_submissions"
+    id = Column(Integer, primary_key=True, index=True)
+    student_id = Column(Integer, ForeignKey("students.id"), index=True)
+    test_id = Column(Integer, ForeignKey("career_tests.id"), index=True)
+    answers = Column(LargeBinary)       # packed (question id, value) pairs, see scoring.py
+    scores = Column(String(100))        # Comma-separated R,I,A,S,E,C totals e.g. "3,5,0,2,1,4"
+    top_code = Column(String(3))        # Holland code e.g. "IRC"
+    submitted_at = Column(DateTime, default=datetime.utcnow)
+
 
 
 
@@ -71,11 +98,15 @@ class CareerPage(Base):
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String(200), unique=True, index=True)
     thumbnail_url = Column(String(500))
+    thumbnail_variants = Column(String(100))  # Widths already resized e.g. "160,320,640", see thumbnails.py
     slug = Column(String(200), unique=True, index=True)
     content = Column(Text)  # HTML from WYSIWYG
     riasec_tags = Column(String(20))  # Comma-separated e.g. "R,I"
+    riasec_mask = Column(Integer, nullable=False, default=0, server_default="0", index=True)  # same tags as bits, R=1 I=2 A=4 S=8 E=16 C=32
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    parent_id = Column(Integer, ForeignKey("career_pages.id"), nullable=True)
+    parent_id = Column(Integer, ForeignKey("career_pages.id"), nullable=True, index=True)
+    path = Column(String(255), index=True)  # Materialized path of ids e.g. "/1/2/7/", see hierarchy.py
+    depth = Column(Integer, nullable=False, default=0, server_default="0")
     children = relationship("CareerPage", backref="parent", remote_side=[id])
 
 
@@ -0,0 +1,133 @@
+# ratelimit.py - Token bucket rate limits for the public endpoints (/login, /register, career pages)
+import os, time, math, threading
+from collections import OrderedDict
+from fastapi import HTTPException, Request, Depends
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "1") == "1"
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL")      # share the buckets between workers, e.g. redis://localhost:6379/0
+MAX_BUCKETS = int(os.getenv("RATE_LIMIT_MAX_BUCKETS", "100000"))
+
+try:
+    import redis      # optional, only needed with RATE_LIMIT_REDIS_URL
+except ImportError:
+    redis = None
+
+
+# (tokens per second, burst) - a client can fire `burst` requests at once, then `rate` per second.
+# An "IP" is often a whole school behind one NAT: every student logging in for the first lesson,
+# a class registering together. The per-IP limits only stop floods from one source; guessing
+# passwords is what login_email is for. Override one with e.g. RATE_LIMIT_LOGIN_IP="10,1000".
+DEFAULT_LIMITS = {
+    "login_ip": (10.0, 1000),       # ~1000 students in one burst, 600 a minute after that
+    "login_email": (0.1, 5),        # credential stuffing against one account
+    "register_ip": (2.0, 500),
+    "page_ip": (50.0, 1000),
+}
+
+def _configured(name: str, default: tuple) -> tuple:
+    value = os.getenv(f"RATE_LIMIT_{name.upper()}")
+    if not value:
+        return default
+    rate, burst = value.split(",")
+    return float(rate), int(burst)
+
+LIMITS = {name: _configured(name, default) for name, default in DEFAULT_LIMITS.items()}
+
+
+class MemoryBackend:
+    """Buckets in this process. With several workers each keeps its own, so the real limit is N x the configured one."""
+
+    def __init__(self, max_buckets: int = MAX_BUCKETS):
+        self.buckets = OrderedDict()    # key -> [tokens, last refill, rate, burst], least recently used first
+        self.lock = threading.Lock()
+        self.max_buckets = max_buckets
+
+    def take(self, key: str, rate: float, burst: int) -> float:
+        """Spend one token; returns 0 when allowed, else the seconds until a token is available."""
+        now = time.monotonic()
+        with self.lock:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                if len(self.buckets) >= self.max_buckets:
+                    self._prune(now)
+                bucket = self.buckets[key] = [float(burst), now, rate, burst]
+            else:
+                self.buckets.move_to_end(key)
+            tokens = min(burst, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+            if tokens >= 1:
+                bucket[0] = tokens - 1
+                return 0.0
+            bucket[0] = tokens
+            return (1 - tokens) / rate
+
+    def _prune(self, now: float):
+        # Buckets that have refilled completely (by their own limit) carry no state - dropping them
+        # changes nothing. If that isn't enough, the least recently used go: a flood of new keys (random
+        # emails) then only pushes out idle buckets, never the one being hammered.
+        for key in [k for k, (_, updated, rate, burst) in self.buckets.items() if now - updated > burst / rate]:
+            del self.buckets[key]
+        while len(self.buckets) >= self.max_buckets * 0.9:
+            self.buckets.popitem(last=False)
+
+
+class RedisBackend:
+    """Buckets in Redis (or anything speaking its protocol), shared by every worker. Refill + take is one Lua call."""
+
+    SCRIPT = """
+    local rate, burst, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+    local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+    local tokens = tonumber(bucket[1]) or burst
+    tokens = math.min(burst, tokens + math.max(0, now - (tonumber(bucket[2]) or now)) * rate)
+    local wait = 0
+    if tokens >= 1 then tokens = tokens - 1 else wait = (1 - tokens) / rate end
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+    redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+    return tostring(wait)
+    """
+
+    def __init__(self, url: str):
+        self.client = redis.Redis.from_url(url)
+        self.script = self.client.register_script(self.SCRIPT)
+
+    def take(self, key: str, rate: float, burst: int) -> float:
+        return float(self.script(keys=[f"ratelimit:{key}"], args=[rate, burst, time.time()]))
+
+
+class RateLimiter:
+    def __init__(self, backend):
+        self.backend = backend
+        self.rejected = 0
+
+    def enforce(self, name: str, subject: str):
+        """429 with Retry-After once `subject` (an IP, an email) has used up its `name` bucket."""
+        if not RATE_LIMIT_ENABLED:
+            return
+        rate, burst = LIMITS[name]
+        wait = self.backend.take(f"{name}:{subject}", rate, burst)
+        if wait > 0:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=429, detail="Too many requests, try again later",
+                headers={"Retry-After": str(math.ceil(wait))}
+            )
+
+def make_backend():
+    if RATE_LIMIT_REDIS_URL:
+        if redis is None:
+            raise RuntimeError("RATE_LIMIT_REDIS_URL is set but the redis package is not installed")
+        return RedisBackend(RATE_LIMIT_REDIS_URL)
+    return MemoryBackend()
+
+limiter = RateLimiter(make_backend())
+
+
+def client_ip(request: Request) -> str:
+    # Behind a proxy run uvicorn with --proxy-headers so this is the real client, not the proxy
+    return request.client.host if request.client else "unknown"
+
+def limit_by_ip(name: str):
+    """Route dependency: dependencies=[limit_by_ip("page_ip")]"""
+    def dependency(request: Request):
+        limiter.enforce(name, client_ip(request))
+    return Depends(dependency)
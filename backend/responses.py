@@ -0,0 +1,41 @@
+# responses.py - Fast path for the large JSON responses (admin lists, career pages)
+import os
+from fastapi import Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from pydantic import TypeAdapter
+
+# Both opt in, like METRICS_ENABLED / DB_SINGLE_WRITER. Compression is often done by the proxy in
+# front already; the fast serializer can be switched off if a client trips over a difference in output.
+COMPRESS_RESPONSES = os.getenv("COMPRESS_RESPONSES", "0") == "1"
+FAST_JSON = os.getenv("FAST_JSON", "0") == "1"
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", "1024"))    # bytes - small bodies aren't worth compressing
+COMPRESS_LEVEL = int(os.getenv("COMPRESS_LEVEL", "6"))
+
+try:
+    from brotli_asgi import BrotliMiddleware     # optional, falls back to gzip for clients without br
+except ImportError:
+    BrotliMiddleware = None
+
+
+def add_compression(app):
+    if not COMPRESS_RESPONSES:
+        return
+    if BrotliMiddleware is not None:
+        app.add_middleware(BrotliMiddleware, minimum_size=COMPRESS_MIN_SIZE, gzip_fallback=True)
+    else:
+        app.add_middleware(GZipMiddleware, minimum_size=COMPRESS_MIN_SIZE, compresslevel=COMPRESS_LEVEL)
+
+
+def fast_json(adapter: TypeAdapter, data, headers: dict = None) -> Response:
+    """Validate ORM objects once and serialize straight to bytes in pydantic-core (Rust).
+
+    Returning a Response skips FastAPI's own pass, which would validate the same data again against
+    response_model and then run jsonable_encoder over it. response_model stays on the route for the docs.
+    With FAST_JSON=0 the validated data goes through jsonable_encoder / json.dumps, FastAPI's own way."""
+    validated = adapter.validate_python(data, from_attributes=True)
+    if not FAST_JSON:
+        return JSONResponse(content=jsonable_encoder(adapter.dump_python(validated)), headers=headers)
+    body = adapter.dump_json(validated)
+    return Response(content=body, media_type="application/json", headers=headers)
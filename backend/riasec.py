@@ -0,0 +1,145 @@
+# riasec.py - RIASEC (Holland code) tags as a 6-bit mask, and the in-memory career recommender
+import os, time, threading
+from typing import Optional
+import numpy as np
+from sqlalchemy import text, select, inspect
+from sqlalchemy.engine import Engine
+from models import CareerPage
+
+RIASEC = "RIASEC"       # Realistic, Investigative, Artistic, Social, Enterprising, Conventional
+RECOMMENDER_TTL = float(os.getenv("RECOMMENDER_TTL", "300"))    # full rebuild interval, picks up other workers' writes
+
+
+def parse_tags(tags: Optional[str]) -> list:
+    """"R,I" / "Realistic, investigative" -> ["R", "I"] (unknown letters are dropped)."""
+    letters = []
+    for tag in (tags or "").replace(" ", "").split(","):
+        letter = tag[:1].upper()
+        if letter and letter in RIASEC and letter not in letters:
+            letters.append(letter)
+    return letters
+
+def tags_to_mask(tags: Optional[str]) -> int:
+    mask = 0
+    for letter in parse_tags(tags):
+        mask |= 1 << RIASEC.index(letter)
+    return mask
+
+def mask_to_vector(mask: int) -> np.ndarray:
+    return np.array([(mask >> i) & 1 for i in range(len(RIASEC))], dtype=np.float32)
+
+def parse_profile(profile: str) -> np.ndarray:
+    """Student score vector, either "R:0.8,I:0.5,S:0.1" or six numbers in R,I,A,S,E,C order."""
+    vector = np.zeros(len(RIASEC), dtype=np.float32)
+    parts = [p.strip() for p in profile.split(",") if p.strip()]
+    if parts and all(":" in p for p in parts):
+        for part in parts:
+            letter, score = part.split(":", 1)
+            letter = letter.strip()[:1].upper()
+            if letter not in RIASEC:
+                raise ValueError(f"Unknown RIASEC dimension '{letter}'")
+            vector[RIASEC.index(letter)] = float(score)
+    elif len(parts) == len(RIASEC):
+        vector[:] = [float(p) for p in parts]
+    else:
+        raise ValueError("profile must be 'R:0.8,I:0.5,...' or six comma separated scores")
+    if not np.isfinite(vector).all():      # nan / inf, or too big for float32 - can't be ranked or rendered as JSON
+        raise ValueError("profile scores must be finite numbers")
+    return vector
+
+
+# Backfill migration for the riasec_mask column (added after the table already had data)
+def migrate_riasec_mask(engine: Engine):
+    inspector = inspect(engine)
+    if not inspector.has_table("career_pages"):
+        return
+    with engine.begin() as conn:
+        if "riasec_mask" not in [c["name"] for c in inspector.get_columns("career_pages")]:
+            conn.execute(text("ALTER TABLE career_pages ADD COLUMN riasec_mask INTEGER NOT NULL DEFAULT 0"))
+        for index in CareerPage.__table__.indexes:
+            if any(c.name == "riasec_mask" for c in index.columns):
+                index.create(bind=conn, checkfirst=True)
+        rows = conn.execute(
+            select(CareerPage.id, CareerPage.riasec_tags)
+            .where(CareerPage.riasec_mask == 0, CareerPage.riasec_tags != "")
+        ).all()
+        updates = [{"page_id": r.id, "mask": tags_to_mask(r.riasec_tags)} for r in rows]
+        if updates:
+            conn.execute(text("UPDATE career_pages SET riasec_mask = :mask WHERE id = :page_id"), updates)
+
+
+
+
+
+# Every page as one row of an (n x 6) matrix of unit vectors, so ranking all of them against a
+# student profile is a single matrix-vector product instead of a loop over pages.
+class Recommender:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.matrix = np.zeros((0, len(RIASEC)), dtype=np.float32)
+        self.size = 0
+        self.row_of = {}            # page id -> row
+        self.meta = []              # row -> page fields returned to the client
+        self.built_at = None
+
+    def rebuild(self, db):
+        rows = db.execute(select(
+            CareerPage.id, CareerPage.title, CareerPage.slug, CareerPage.thumbnail_url,
+            CareerPage.riasec_tags, CareerPage.riasec_mask
+        )).all()
+        masks = np.array([r.riasec_mask or 0 for r in rows], dtype=np.int64)
+        bits = ((masks[:, None] >> np.arange(len(RIASEC))) & 1).astype(np.float32)
+        with self.lock:
+            self.matrix = self._normalize(bits)
+            self.size = len(rows)
+            self.row_of = {r.id: i for i, r in enumerate(rows)}
+            self.meta = [self._meta(r) for r in rows]
+            self.built_at = time.monotonic()
+
+    def upsert(self, page):
+        """Incremental update after a page is created / edited - one row, no rebuild."""
+        with self.lock:
+            if self.built_at is None:
+                return          # not built yet, the first recommend call will read the page from the DB
+            vector = self._normalize(mask_to_vector(page.riasec_mask or 0)[None, :])[0]
+            row = self.row_of.get(page.id)
+            if row is None:
+                row = self.size
+                if row == len(self.matrix):     # grow by doubling, amortised O(1) appends
+                    self.matrix = np.resize(self.matrix, (max(16, 2 * row), len(RIASEC)))
+                self.size += 1
+                self.row_of[page.id] = row
+                self.meta.append(None)
+            self.matrix[row] = vector
+            self.meta[row] = self._meta(page)
+
+    def recommend(self, db, profile: np.ndarray, limit: int) -> list:
+        if self.built_at is None or time.monotonic() - self.built_at > RECOMMENDER_TTL:
+            self.rebuild(db)
+
+        norm = np.linalg.norm(profile)
+        with self.lock:
+            if self.size == 0 or norm == 0:
+                return []
+            scores = self.matrix[:self.size] @ (profile / norm)        # cosine similarity with every page
+            k = min(limit, self.size)
+            top = np.argpartition(-scores, k - 1)[:k]                  # O(n) top-k, then sort only those k
+            top = top[np.argsort(-scores[top], kind="stable")]
+            return [dict(self.meta[i], score=round(float(scores[i]), 4)) for i in top]
+
+    @staticmethod
+    def _normalize(bits: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(bits, axis=1, keepdims=True)
+        return np.divide(bits, norms, out=np.zeros_like(bits), where=norms > 0)
+
+    @staticmethod
+    def _meta(page) -> dict:
+        return {
+            "id": page.id,
+            "title": page.title,
+            "slug": page.slug,
+            "thumbnail_url": page.thumbnail_url,
+            "riasec_tags": page.riasec_tags,
+        }
+
+recommender = Recommender()
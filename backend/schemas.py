@@ -1,6 +1,17 @@
-from pydantic import BaseModel, Field
-from typing import List, Optional
+from pydantic import BaseModel, Field, computed_field
+from typing import List, Optional, Dict, Annotated
 from datetime import datetime
+from thumbnails import variant_url
+
+# Create request body model (/register, and each row of /admin/import/students)
+class StudentCreate(BaseModel):
+    first_name: str
+    last_name: str
+    grade: str
+    email: str
+    country: str
+    phone: str
+    password: str
 
 class StudentSchema(BaseModel):
     id: int
@@ -45,6 +56,16 @@ class CareerTestSchema(BaseModel):
     class Config:
         from_attributes = True
 
+# Light listing of tests (GET /admin/tests?fields=summary) - no question bodies
+class CareerTestSummarySchema(BaseModel):
+    id: int
+    name: str
+    number_of_questions: int
+    last_updated: datetime
+
+    class Config:
+        from_attributes = True
+
 class QuestionCreateSchema(BaseModel):
     description: str
     tag: str
@@ -52,7 +73,7 @@ class QuestionCreateSchema(BaseModel):
 class CareerTestCreateSchema(BaseModel):
     name: str
     description: str
-    number_of_questions: int
+    number_of_questions: Optional[int] = None   # still accepted, but the server counts the questions itself
     questions: List[QuestionCreateSchema]
 
     class Config:
@@ -61,9 +82,22 @@ class CareerTestCreateSchema(BaseModel):
 class CareerTestUpdateSchema(BaseModel):
     name: str
     description: str
-    number_of_questions: int
+    number_of_questions: Optional[int] = None   # ignored, see CareerTestCreateSchema
     questions: List[QuestionSchema]
 
+# Stored as int32 question ids (scoring.ANSWER_DTYPE), so anything outside that range is rejected here
+QuestionId = Annotated[int, Field(ge=1, le=2 ** 31 - 1)]
+
+class TestSubmissionCreate(BaseModel):
+    student_id: Optional[int] = None    # taken from the token when a student submits; only read without one, or from an admin
+    answers: Dict[QuestionId, Annotated[int, Field(ge=0, le=255)]] = Field(..., description="question id -> answer value, e.g. on a 0-4 scale")
+
+class TestResultSchema(BaseModel):
+    submission_id: int
+    test_id: int
+    scores: Dict[str, float]      # {"R": 3.0, "I": 5.0, ...}
+    top_code: str
+
 
 
 
@@ -88,8 +122,25 @@ class CareerPageCreate(CareerPageBase):
     parent_id : Optional[int]
     pass
 
+# Library index row (GET /career-pages?fields=summary) - everything except the HTML content
+class CareerPageSummary(BaseModel):
+    id: int
+    title: str
+    slug: str
+    thumbnail_url: Optional[str] = None
+    thumbnail_variant_url: Optional[str] = None     # resized WebP for the listing
+    riasec_tags: Optional[str] = ""
+    parent_id: Optional[int] = None
+
 class CareerPageOut(CareerPageBase):
     id: int
     parent_id : Optional[int]
+    thumbnail_variants: Optional[str] = Field(None, exclude=True)
+
+    @computed_field
+    @property
+    def thumbnail_variant_url(self) -> Optional[str]:     # resized WebP, as in CareerPageSummary
+        return variant_url(self.thumbnail_url, self.thumbnail_variants)
+
     class Config:
         from_attributes = True
\ No newline at end of file
@@ -0,0 +1,198 @@
+# scoring.py - Career test scoring: each test compiled once into a (questions x RIASEC) matrix
+import logging, threading
+from concurrent.futures import ThreadPoolExecutor, Future
+import numpy as np
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+from models import CareerTest, Question, Student, TestSubmission
+from riasec import RIASEC
+from analytics import count_test_taken
+from database import SINGLE_WRITER, write_lock
+
+logger = logging.getLogger("career")
+
+# Answers are stored as packed (question id, value) pairs - 5 bytes per answer
+ANSWER_DTYPE = np.dtype([("q", "<i4"), ("v", "u1")])
+
+
+def pack_answers(answers: dict) -> bytes:
+    packed = np.array(sorted(answers.items()), dtype=ANSWER_DTYPE) if answers else np.zeros(0, dtype=ANSWER_DTYPE)
+    return packed.tobytes()
+
+def unpack_answers(raw: bytes) -> np.ndarray:
+    return np.frombuffer(raw or b"", dtype=ANSWER_DTYPE)
+
+def format_scores(vector) -> str:
+    return ",".join(f"{float(x):g}" for x in vector)      # "R,I,A,S,E,C" order, like riasec_tags
+
+def top_code(vector) -> str:
+    """Holland code: the three highest dimensions, e.g. "RIC" (zero scores left out)."""
+    order = np.argsort(-np.asarray(vector), kind="stable")[:3]
+    return "".join(RIASEC[i] for i in order if vector[i] > 0)
+
+
+class CompiledTest:
+    def __init__(self, last_updated, question_ids: np.ndarray, matrix: np.ndarray):
+        self.last_updated = last_updated
+        self.question_ids = question_ids        # sorted, so answer ids map to rows with searchsorted
+        self.matrix = matrix                    # float32 (questions x 6), one-hot on the question's tag
+
+    def columns_for(self, question_ids: np.ndarray):
+        """Row in the matrix for each answered question id, and which answers belong to this test at all."""
+        if not len(self.question_ids):
+            return np.zeros(len(question_ids), dtype=np.intp), np.zeros(len(question_ids), dtype=bool)
+        rows = np.minimum(np.searchsorted(self.question_ids, question_ids), len(self.question_ids) - 1)
+        return rows, self.question_ids[rows] == question_ids
+
+    def score(self, answers: np.ndarray) -> np.ndarray:
+        vector = np.zeros(len(self.question_ids), dtype=np.float32)
+        rows, valid = self.columns_for(answers["q"])
+        vector[rows[valid]] = answers["v"][valid]
+        return vector @ self.matrix             # one matrix-vector product gives all six scores
+
+    def score_many(self, packed_answers: list) -> np.ndarray:
+        """(submissions x questions) answer matrix @ (questions x 6) in one go."""
+        answer_matrix = np.zeros((len(packed_answers), len(self.question_ids)), dtype=np.float32)
+        decoded = [unpack_answers(raw) for raw in packed_answers]
+        if decoded:
+            owners = np.repeat(np.arange(len(decoded)), [len(a) for a in decoded])
+            flat = np.concatenate(decoded)
+            rows, valid = self.columns_for(flat["q"])
+            answer_matrix[owners[valid], rows[valid]] = flat["v"][valid]
+        return answer_matrix @ self.matrix
+
+
+class TestCompiler:
+    """Per-test cache of CompiledTest, recompiled when the test's last_updated changes."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.compiled = {}
+
+    def get(self, db: Session, test_id: int):
+        last_updated = db.execute(select(CareerTest.last_updated).where(CareerTest.id == test_id)).scalar()
+        if last_updated is None:
+            return None
+        with self.lock:
+            cached = self.compiled.get(test_id)
+        if cached and cached.last_updated == last_updated:
+            return cached
+
+        rows = db.execute(select(Question.id, Question.tag).where(Question.test_id == test_id).order_by(Question.id)).all()
+        question_ids = np.array([r.id for r in rows], dtype=np.int32)
+        matrix = np.zeros((len(rows), len(RIASEC)), dtype=np.float32)
+        for i, r in enumerate(rows):
+            letter = (r.tag or "")[:1].upper()      # tags are stored as "Investigative" or "I"
+            if letter in RIASEC:
+                matrix[i, RIASEC.index(letter)] = 1.0
+
+        compiled = CompiledTest(last_updated, question_ids, matrix)
+        with self.lock:
+            self.compiled[test_id] = compiled
+        return compiled
+
+test_compiler = TestCompiler()
+
+
+def submit_answers(db: Session, test_id: int, student_id: int, answers: dict):
+    """Score one submission, store it and bump the student's career_test_count - one transaction, caller commits.
+    Raises LookupError when the test or the student doesn't exist."""
+    compiled = test_compiler.get(db, test_id)
+    if compiled is None:
+        raise LookupError("Test not found")
+
+    packed = pack_answers(answers)
+    scores = compiled.score(unpack_answers(packed))
+    submission = TestSubmission(
+        student_id=student_id,
+        test_id=test_id,
+        answers=packed,
+        scores=format_scores(scores),
+        top_code=top_code(scores),
+    )
+    # Atomic increment in SQL (UPDATE ... SET count = count + 1), safe against concurrent submissions
+    counted = db.execute(
+        update(Student)
+        .where(Student.id == student_id)
+        .values(career_test_count=Student.career_test_count + 1)
+        .execution_options(synchronize_session=False)
+    )
+    if counted.rowcount == 0:
+        raise LookupError("Student not found")
+    count_test_taken(db, student_id)        # dashboard rollup, see analytics.py
+    db.add(submission)
+    db.flush()
+    return submission, scores
+
+
+def _rescore_batch(db: Session, compiled: CompiledTest, test_id: int, last_id: int, batch_size: int) -> list:
+    """Re-score the next `batch_size` submissions after `last_id`; returns their ids (empty when none are left)."""
+    batch = db.execute(
+        select(TestSubmission.id, TestSubmission.answers)
+        .where(TestSubmission.test_id == test_id, TestSubmission.id > last_id)
+        .order_by(TestSubmission.id)
+        .limit(batch_size)
+    ).all()
+    if not batch:
+        return []
+    scores = compiled.score_many([r.answers for r in batch])
+    db.execute(
+        update(TestSubmission),
+        [{"id": r.id, "scores": format_scores(s), "top_code": top_code(s)} for r, s in zip(batch, scores)]
+    )
+    return [r.id for r in batch]
+
+def rescore_test(db: Session, test_id: int, batch_size: int = 5000) -> int:
+    """Re-score every stored submission of a test against its current questions, batch by batch.
+    Only flushes - the caller commits, so it is all one transaction."""
+    compiled = test_compiler.get(db, test_id)
+    if compiled is None:
+        return 0
+
+    rescored, last_id = 0, 0
+    while ids := _rescore_batch(db, compiled, test_id, last_id, batch_size):
+        rescored += len(ids)
+        last_id = ids[-1]
+    return rescored
+
+
+# After a test is edited its stored results are re-scored here, off the request: one job at a time,
+# each batch its own transaction, and with DB_SINGLE_WRITER=1 write_lock held only for one batch.
+# Not a BackgroundTask - those run while the request that queued them still holds write_lock.
+_rescore_jobs = None
+_rescore_jobs_lock = threading.Lock()
+
+def queue_rescore(test_id: int, session_factory) -> Future:
+    global _rescore_jobs
+    with _rescore_jobs_lock:
+        if _rescore_jobs is None:
+            _rescore_jobs = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rescore")
+        return _rescore_jobs.submit(_rescore_in_batches, test_id, session_factory)
+
+def drain_rescores():
+    """Wait for the queued re-scoring (app shutdown, bench.py); a later queue_rescore starts a new thread."""
+    global _rescore_jobs
+    with _rescore_jobs_lock:
+        jobs, _rescore_jobs = _rescore_jobs, None
+    if jobs is not None:
+        jobs.shutdown(wait=True)
+
+def _rescore_in_batches(test_id: int, session_factory, batch_size: int = 1000):
+    db = session_factory()
+    try:
+        compiled = test_compiler.get(db, test_id)
+        db.rollback()       # end the read, batches start fresh transactions
+        ids = [0]
+        while compiled is not None and ids:
+            if SINGLE_WRITER:
+                write_lock.acquire()
+            try:
+                ids = _rescore_batch(db, compiled, test_id, ids[-1], batch_size)
+                db.commit()
+            finally:
+                if SINGLE_WRITER:
+                    write_lock.release()
+    except Exception:
+        logger.exception("Re-scoring test %s failed", test_id)
+    finally:
+        db.close()
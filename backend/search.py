@@ -0,0 +1,239 @@
+# search.py - Full-text search (SQLite FTS5) for the admin student list and the career library
+import re, html
+from html.parser import HTMLParser
+from typing import Optional
+from sqlalchemy import text, select, or_, table, column, inspect
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from models import Student, CareerPage
+
+
+# External-content FTS5 table: it stores only the index, the rows themselves stay in `students`.
+# The triggers keep it in sync on every insert / update / delete, so no app code has to remember it.
+STUDENT_FTS_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS students_fts USING fts5(
+        first_name, last_name, email,
+        content='students', content_rowid='id',
+        tokenize="unicode61 tokenchars '@.'"
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS students_fts_ai AFTER INSERT ON students BEGIN
+        INSERT INTO students_fts(rowid, first_name, last_name, email)
+        VALUES (new.id, new.first_name, new.last_name, new.email);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS students_fts_ad AFTER DELETE ON students BEGIN
+        INSERT INTO students_fts(students_fts, rowid, first_name, last_name, email)
+        VALUES ('delete', old.id, old.first_name, old.last_name, old.email);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS students_fts_au AFTER UPDATE ON students BEGIN
+        INSERT INTO students_fts(students_fts, rowid, first_name, last_name, email)
+        VALUES ('delete', old.id, old.first_name, old.last_name, old.email);
+        INSERT INTO students_fts(rowid, first_name, last_name, email)
+        VALUES (new.id, new.first_name, new.last_name, new.email);
+    END
+    """,
+]
+
+
+students_fts = table("students_fts", column("rowid"), column("students_fts"))
+
+
+def setup_student_search(engine: Engine):
+    """Create the sort_by indexes and the students FTS table (+ triggers) if they are missing."""
+    if not inspect(engine).has_table("students"):
+        return
+
+    for index in Student.__table__.indexes:
+        index.create(bind=engine, checkfirst=True)
+
+    if engine.dialect.name != "sqlite":
+        return
+
+    with engine.begin() as conn:
+        existed = conn.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'students_fts'"
+        )).first()
+        for statement in STUDENT_FTS_DDL:
+            conn.execute(text(statement))
+        if not existed:
+            # First run on an existing database - index the students that are already there
+            conn.execute(text("INSERT INTO students_fts(students_fts) VALUES ('rebuild')"))
+
+
+def fts_prefix_query(search: str) -> str:
+    """Turn free text into an FTS5 query: every word is a quoted prefix term, all words must match."""
+    words = re.findall(r"[\w@.+-]+", search)
+    return " ".join('"' + w.replace('"', '""') + '"*' for w in words)
+
+
+def student_search_filter(search: str, dialect: str):
+    """WHERE clause matching students whose first name, last name or email start with the search words."""
+    if dialect == "sqlite":
+        match = fts_prefix_query(search)
+        if not match:
+            return Student.id.in_([])
+        return Student.id.in_(
+            select(students_fts.c.rowid).where(students_fts.c.students_fts.op("MATCH")(match))
+        )
+
+    # Other databases: plain prefix LIKE, which a btree index can serve
+    pattern = search.strip() + "%"
+    return or_(Student.first_name.like(pattern), Student.last_name.like(pattern), Student.email.like(pattern))
+
+
+
+
+
+# Career library search. Page content is WYSIWYG HTML, which a trigger can't strip, so this index is a
+# plain FTS5 table (it stores the stripped text, which snippet() needs) written by index_page() in the
+# same transaction as the page itself. Only deletes are left to a trigger.
+PAGE_FTS_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS career_pages_fts USING fts5(
+        title, body,
+        tokenize="unicode61 remove_diacritics 2"
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS career_pages_fts_ad AFTER DELETE ON career_pages BEGIN
+        DELETE FROM career_pages_fts WHERE rowid = old.id;
+    END
+    """,
+]
+
+# PostgreSQL: the same search over a GIN expression index. The default parser skips HTML tags itself.
+PAGE_TSVECTOR = "to_tsvector('english', coalesce(title, '') || ' ' || coalesce(content, ''))"
+PAGE_TSVECTOR_INDEX = f"CREATE INDEX IF NOT EXISTS ix_career_pages_search ON career_pages USING GIN ({PAGE_TSVECTOR})"
+
+TITLE_WEIGHT = 10.0         # bm25 weight of a title hit relative to a body hit
+SNIPPET_TOKENS = 16
+SNIPPET_START, SNIPPET_END = "\x02", "\x03"      # placeholders, swapped for <mark> after escaping
+
+
+class _TextExtractor(HTMLParser):
+    SKIP = {"script", "style"}
+
+    def __init__(self):
+        super().__init__()      # convert_charrefs: &amp; etc. arrive already decoded
+        self.parts = []
+        self.skipping = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP:
+            self.skipping += 1
+        else:
+            self.parts.append(" ")      # <p>a</p><p>b</p> must not become "ab"
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP and self.skipping:
+            self.skipping -= 1
+
+    def handle_data(self, data):
+        if not self.skipping:
+            self.parts.append(data)
+
+def strip_html(content: Optional[str]) -> str:
+    extractor = _TextExtractor()
+    extractor.feed(content or "")
+    extractor.close()
+    return " ".join("".join(extractor.parts).split())
+
+
+def index_page(db: Session, page: CareerPage):
+    """(Re)index one page - call after it is flushed (it needs the id), before the commit."""
+    if db.get_bind().dialect.name != "sqlite":
+        return      # the PostgreSQL expression index follows the row by itself
+    db.execute(text("DELETE FROM career_pages_fts WHERE rowid = :id"), {"id": page.id})
+    db.execute(
+        text("INSERT INTO career_pages_fts(rowid, title, body) VALUES (:id, :title, :body)"),
+        {"id": page.id, "title": page.title or "", "body": strip_html(page.content)}
+    )
+
+
+def setup_page_search(engine: Engine):
+    """Create the career page search index if it is missing and fill it from the existing pages."""
+    if not inspect(engine).has_table("career_pages"):
+        return
+
+    with engine.begin() as conn:
+        if engine.dialect.name != "sqlite":
+            if engine.dialect.name == "postgresql":
+                conn.execute(text(PAGE_TSVECTOR_INDEX))
+            return
+
+        existed = conn.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'career_pages_fts'"
+        )).first()
+        for statement in PAGE_FTS_DDL:
+            conn.execute(text(statement))
+        if existed:
+            return
+        # First run on an existing database - strip and index the pages that are already there
+        result = conn.execute(
+            select(CareerPage.id, CareerPage.title, CareerPage.content).execution_options(yield_per=500)
+        )
+        for rows in result.partitions():
+            conn.execute(
+                text("INSERT INTO career_pages_fts(rowid, title, body) VALUES (:id, :title, :body)"),
+                [{"id": r.id, "title": r.title or "", "body": strip_html(r.content)} for r in rows]
+            )
+
+
+def _snippet_html(snippet: Optional[str]) -> str:
+    # The indexed text is decoded, so it may contain "<" - escape it, then add our own markup
+    return html.escape(snippet or "").replace(SNIPPET_START, "<mark>").replace(SNIPPET_END, "</mark>")
+
+
+def search_pages(db: Session, search: str, limit: int, after: Optional[tuple] = None) -> list:
+    """Best matches first (ties by id). `after` = (score, id) of the last row of the previous page.
+    Every word is a prefix term, so "data sci" finds "Data Science"."""
+    dialect = db.get_bind().dialect.name
+    params = {"limit": limit}
+    if after:
+        params.update(after_score=after[0], after_id=after[1])
+
+    if dialect == "sqlite":
+        match = fts_prefix_query(search)
+        if not match:
+            return []
+        params.update(match=match, title_weight=TITLE_WEIGHT, start=SNIPPET_START, end=SNIPPET_END, tokens=SNIPPET_TOKENS)
+        score = "bm25(career_pages_fts, :title_weight, 1.0)"        # lower is better
+        where = "career_pages_fts MATCH :match"
+        if after:
+            where += f" AND ({score}, p.id) > (:after_score, :after_id)"
+        rows = db.execute(text(f"""
+            SELECT p.id, p.title, p.slug, p.thumbnail_url, p.riasec_tags,
+                   snippet(career_pages_fts, 1, :start, :end, '…', :tokens) AS snippet,
+                   {score} AS score
+            FROM career_pages_fts JOIN career_pages p ON p.id = career_pages_fts.rowid
+            WHERE {where}
+            ORDER BY score, p.id
+            LIMIT :limit
+        """), params).all()
+    else:
+        words = re.findall(r"\w+", search)
+        if not words:
+            return []
+        params.update(query=" & ".join(w + ":*" for w in words))
+        score = f"-ts_rank({PAGE_TSVECTOR}, to_tsquery('english', :query))"       # negated so lower is better here too
+        where = f"{PAGE_TSVECTOR} @@ to_tsquery('english', :query)"
+        if after:
+            where += f" AND ({score}, id) > (:after_score, :after_id)"
+        rows = db.execute(text(f"""
+            SELECT id, title, slug, thumbnail_url, riasec_tags,
+                   ts_headline('english', regexp_replace(content, '<[^>]*>', ' ', 'g'), to_tsquery('english', :query),
+                               'StartSel=' || chr(2) || ', StopSel=' || chr(3) || ', MaxWords=20, MinWords=8') AS snippet,
+                   {score} AS score
+            FROM career_pages
+            WHERE {where}
+            ORDER BY score, id
+            LIMIT :limit
+        """), params).all()
+
+    return [dict(row._asdict(), snippet=_snippet_html(row.snippet)) for row in rows]
@@ -0,0 +1,57 @@
+# security.py - Password hashing (scrypt) run in a bounded thread pool so it never blocks the event loop
+import os, base64, hashlib, hmac, secrets, asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+# scrypt cost - ~16 MB and a few tens of ms per hash. hashlib releases the GIL while hashing,
+# so a small thread pool gives real parallelism and caps how much CPU logins can take at once.
+SCRYPT_N = int(os.getenv("SCRYPT_N", str(2 ** 14)))
+SCRYPT_R = 8
+SCRYPT_P = 1
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+hash_pool = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="pwhash")
+
+# Bulk imports hash plaintext passwords in their own pool, so a big file doesn't queue thousands of
+# hashes in front of /login and /register. One worker does ~35 hashes/s at the default cost (about
+# 27 ms each), so a plaintext import is capped near 35 rows/s per worker - 10k rows take ~5 minutes.
+# Rows exported from another instance carry their hashes and skip this entirely.
+IMPORT_HASH_WORKERS = int(os.getenv("IMPORT_HASH_WORKERS", "1"))
+
+import_hash_pool = ThreadPoolExecutor(max_workers=IMPORT_HASH_WORKERS, thread_name_prefix="pwhash-import")
+
+
+def _b64(raw: bytes) -> str:
+    return base64.b64encode(raw).decode()
+
+def _scrypt(password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+    return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p, maxmem=128 * n * r * 2, dklen=32)
+
+
+def hash_password_sync(password: str) -> str:
+    salt = secrets.token_bytes(16)
+    digest = _scrypt(password, salt, SCRYPT_N, SCRYPT_R, SCRYPT_P)
+    return f"scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${_b64(salt)}${_b64(digest)}"
+
+def is_hashed(stored: str) -> bool:
+    return bool(stored) and stored.startswith("scrypt$")
+
+def verify_password_sync(password: str, stored: str) -> bool:
+    if not stored:
+        return False
+    if not is_hashed(stored):
+        # Legacy plaintext row (registered before hashing) - still compared in constant time
+        return hmac.compare_digest(password.encode(), stored.encode())
+    _, n, r, p, salt, digest = stored.split("$")
+    candidate = _scrypt(password, base64.b64decode(salt), int(n), int(r), int(p))
+    return hmac.compare_digest(candidate, base64.b64decode(digest))
+
+
+# Verified when the email doesn't exist, so unknown and known emails take the same time
+DUMMY_HASH = hash_password_sync(secrets.token_hex(16))
+
+
+async def hash_password(password: str) -> str:
+    return await asyncio.get_running_loop().run_in_executor(hash_pool, hash_password_sync, password)
+
+async def verify_password(password: str, stored: str) -> bool:
+    return await asyncio.get_running_loop().run_in_executor(hash_pool, verify_password_sync, password, stored)
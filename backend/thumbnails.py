@@ -0,0 +1,148 @@
+# thumbnails.py - Resized WebP/JPEG variants of career page thumbnails, made in a process pool
+import os, re, glob, logging, threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, Future
+from typing import Optional
+from sqlalchemy import text, update, inspect
+from sqlalchemy.engine import Engine
+from models import CareerPage
+from uploads import UPLOAD_DIR
+from cache import career_page_cache
+from database import SINGLE_WRITER, write_lock
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:         # Pillow is optional - without it pages just keep serving the original upload
+    Image = None
+
+VARIANT_WIDTHS = (160, 320, 640)
+VARIANT_FORMATS = {"webp": "WEBP", "jpg": "JPEG"}
+VARIANT_DIR = os.path.join(UPLOAD_DIR, "variants")
+THUMBNAIL_WORKERS = int(os.getenv("THUMBNAIL_WORKERS", "2"))
+STEM_PATTERN = re.compile(r"[A-Za-z0-9_-]{1,100}")
+
+os.makedirs(VARIANT_DIR, exist_ok=True)
+
+logger = logging.getLogger("career")
+
+_pool = None
+_jobs = None        # threads that hand images to the pool and record the result, one per worker process
+_pool_lock = threading.Lock()
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=THUMBNAIL_WORKERS)
+        return _pool
+
+def _get_jobs() -> ThreadPoolExecutor:
+    global _jobs
+    with _pool_lock:
+        if _jobs is None:
+            _jobs = ThreadPoolExecutor(max_workers=THUMBNAIL_WORKERS, thread_name_prefix="thumbnails")
+        return _jobs
+
+
+def variant_name(stem: str, width: int, ext: str) -> str:
+    return f"{stem}-{width}.{ext}"
+
+def variant_url(thumbnail_url: Optional[str], variants: Optional[str], width: int = 320, ext: str = "webp") -> Optional[str]:
+    """URL of a resized thumbnail, or the original until the background job has recorded that width
+    in `variants` (the page's thumbnail_variants)."""
+    if not thumbnail_url or not thumbnail_url.startswith("/uploads/") or str(width) not in (variants or "").split(","):
+        return thumbnail_url
+    stem = os.path.splitext(os.path.basename(thumbnail_url))[0]
+    if not STEM_PATTERN.fullmatch(stem):
+        return thumbnail_url
+    return f"/thumbnails/{variant_name(stem, width, ext)}"
+
+def find_original(stem: str) -> Optional[str]:
+    if not STEM_PATTERN.fullmatch(stem):
+        return None
+    matches = [p for p in glob.glob(os.path.join(UPLOAD_DIR, glob.escape(stem) + ".*")) if os.path.isfile(p)]
+    return matches[0] if matches else None
+
+
+# Runs in a worker process (top level so it can be pickled)
+def make_variants(src_path: str, stem: str, widths=VARIANT_WIDTHS) -> list:
+    made = []
+    with Image.open(src_path) as original:
+        image = ImageOps.exif_transpose(original)
+        for width in widths:
+            resized = image.copy()
+            if resized.width > width:
+                resized.thumbnail((width, width * 10), Image.LANCZOS)     # keeps the aspect ratio
+            for ext, fmt in VARIANT_FORMATS.items():
+                out_path = os.path.join(VARIANT_DIR, variant_name(stem, width, ext))
+                if os.path.exists(out_path):
+                    continue
+                frame = resized.convert("RGB") if fmt == "JPEG" and resized.mode != "RGB" else resized
+                tmp_path = f"{out_path}.{os.getpid()}.tmp"
+                frame.save(tmp_path, format=fmt, quality=80)
+                os.replace(tmp_path, out_path)
+            made.append(width)
+    return made
+
+
+def generate_variant(stem: str, width: int) -> bool:
+    """Lazy path for /thumbnails/: make one missing width (both formats) and wait for it."""
+    src_path = find_original(stem)
+    if Image is None or src_path is None or width not in VARIANT_WIDTHS:
+        return False
+    get_pool().submit(make_variants, src_path, stem, (width,)).result()
+    return True
+
+
+def drain_jobs():
+    """Wait for the queued thumbnail jobs (app shutdown, bench.py); a later queue_thumbnail starts new threads."""
+    global _jobs
+    with _pool_lock:
+        jobs, _jobs = _jobs, None
+    if jobs is not None:
+        jobs.shutdown(wait=True)
+
+def queue_thumbnail(page_id: int, thumbnail_url: str, session_factory) -> Future:
+    """Fire and forget, after the page is committed. Not a BackgroundTask: those run before the route's
+    dependencies are torn down, i.e. while the request still holds write_lock with DB_SINGLE_WRITER=1."""
+    return _get_jobs().submit(_logged, process_thumbnail, page_id, thumbnail_url, session_factory)
+
+def _logged(job, *args):
+    try:
+        return job(*args)
+    except Exception:
+        logger.exception("Thumbnail job failed")
+
+def process_thumbnail(page_id: int, thumbnail_url: str, session_factory):
+    """Make every variant, then record the widths on the page. Blocking - runs on the thumbnail threads."""
+    if Image is None or not thumbnail_url:
+        return
+    stem = os.path.splitext(os.path.basename(thumbnail_url))[0]
+    src_path = find_original(stem)
+    if src_path is None:
+        return
+    widths = get_pool().submit(make_variants, src_path, stem).result()
+
+    if SINGLE_WRITER:
+        write_lock.acquire()        # only around the write - never while Pillow works
+    db = session_factory()
+    try:
+        slug = db.execute(
+            update(CareerPage)
+            .where(CareerPage.id == page_id, CareerPage.thumbnail_url == thumbnail_url)     # not replaced meanwhile
+            .values(thumbnail_variants=",".join(str(w) for w in widths))
+            .returning(CareerPage.slug)
+        ).scalar()
+        db.commit()
+    finally:
+        db.close()
+        if SINGLE_WRITER:
+            write_lock.release()
+    if slug:
+        career_page_cache.invalidate(("slug", slug))    # cached responses still point at the original
+
+
+def migrate_thumbnail_variants(engine: Engine):
+    inspector = inspect(engine)
+    if inspector.has_table("career_pages") and "thumbnail_variants" not in [c["name"] for c in inspector.get_columns("career_pages")]:
+        with engine.begin() as conn:
+            conn.execute(text("ALTER TABLE career_pages ADD COLUMN thumbnail_variants VARCHAR(100)"))
@@ -0,0 +1,246 @@
+# transfer.py - Bulk import / export of students and career tests as streaming CSV or JSONL
+import io, csv, json
+from itertools import islice
+from datetime import datetime
+from typing import Iterator
+from pydantic import ValidationError
+from sqlalchemy import select, insert
+from sqlalchemy.orm import Session, selectinload
+from models import Student, CareerTest
+from schemas import StudentCreate, CareerTestCreateSchema
+from security import import_hash_pool, hash_password_sync, is_hashed
+from crud import bulk_insert_questions
+from analytics import count_new_students
+
+IMPORT_CHUNK_SIZE = 1000        # rows per transaction
+EXPORT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000      # the report keeps counting past this, it just stops listing
+
+STUDENT_EXPORT_FIELDS = ["id", "first_name", "last_name", "grade", "email", "country", "phone", "premium", "career_test_count"]
+TEST_CSV_FIELDS = ["name", "description", "question", "tag"]
+
+
+def detect_format(filename: str, requested: str = None) -> str:
+    if requested in ("csv", "jsonl"):
+        return requested
+    return "jsonl" if (filename or "").lower().endswith((".jsonl", ".ndjson", ".json")) else "csv"
+
+def read_records(fileobj, fmt: str) -> Iterator[tuple]:
+    """(row number, dict or error) for every record, reading the upload line by line."""
+    text = io.TextIOWrapper(fileobj, encoding="utf-8-sig", newline="")
+    if fmt == "csv":
+        for number, record in enumerate(csv.DictReader(text), start=2):     # row 1 is the header
+            yield number, record
+        return
+    for number, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield number, ValueError(f"Invalid JSON: {e.msg}")
+            continue
+        if isinstance(record, dict):
+            yield number, record
+        else:
+            yield number, ValueError(f"Expected a JSON object, got {type(record).__name__}")
+
+def chunked(iterable, size: int):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+class ImportReport:
+    def __init__(self):
+        self.inserted = 0
+        self.failed = 0
+        self.errors = []
+
+    def error(self, row: int, message: str):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": row, "error": message})
+
+    def as_dict(self) -> dict:
+        return {"inserted": self.inserted, "failed": self.failed, "errors": sorted(self.errors, key=lambda e: e["row"])}
+
+def _validation_message(e: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}" for err in e.errors())
+
+
+
+
+
+# Students: validated with StudentCreate, duplicates found with one IN query per chunk, one INSERT per chunk
+def import_students(db: Session, fileobj, fmt: str) -> dict:
+    report = ImportReport()
+    seen_emails = set()         # duplicates inside the file itself
+
+    for chunk in chunked(read_records(fileobj, fmt), IMPORT_CHUNK_SIZE):
+        valid = []
+        for number, record in chunk:
+            if isinstance(record, Exception):
+                report.error(number, str(record))
+                continue
+            try:
+                student = StudentCreate.model_validate(record)
+            except ValidationError as e:
+                report.error(number, _validation_message(e))
+                continue
+            if student.email in seen_emails:
+                report.error(number, "Email repeated in the file")
+                continue
+            seen_emails.add(student.email)
+            valid.append((number, student))
+
+        emails = [s.email for _, s in valid]
+        existing = set(db.execute(select(Student.email).where(Student.email.in_(emails))).scalars()) if emails else set()
+        new = []
+        for number, student in valid:
+            if student.email in existing:
+                report.error(number, "Email already registered.")
+            else:
+                new.append(student)
+        if not new:
+            continue
+
+        # Rows may carry an already hashed password (e.g. from another instance); the rest are hashed in
+        # the import pool, which is what limits plaintext imports (see IMPORT_HASH_WORKERS)
+        plain = [s.password for s in new if not is_hashed(s.password)]
+        hashed = iter(import_hash_pool.map(hash_password_sync, plain))
+        rows = [
+            dict(s.model_dump(), password=s.password if is_hashed(s.password) else next(hashed), premium=False, career_test_count=0)
+            for s in new
+        ]
+        db.execute(insert(Student), rows)
+        count_new_students(db, rows)
+        db.commit()
+        report.inserted += len(rows)
+
+    return report.as_dict()
+
+
+def _read_tests(records) -> Iterator[tuple]:
+    """JSONL: one test (with its questions) per line. CSV: name,description,question,tag - one row per
+    question, consecutive rows with the same name form one test."""
+    current = None
+    for number, record in records:
+        if isinstance(record, Exception) or "question" not in record:
+            if current:
+                yield current
+                current = None
+            yield number, record
+            continue
+        if current and current[1]["name"] == record.get("name"):
+            current[1]["questions"].append({"description": record.get("question"), "tag": record.get("tag")})
+            continue
+        if current:
+            yield current
+        current = (number, {
+            "name": record.get("name"),
+            "description": record.get("description"),
+            "questions": [{"description": record.get("question"), "tag": record.get("tag")}],
+        })
+    if current:
+        yield current
+
+
+def import_tests(db: Session, fileobj, fmt: str) -> dict:
+    report = ImportReport()
+    seen_names = set()
+
+    for chunk in chunked(_read_tests(read_records(fileobj, fmt)), max(1, IMPORT_CHUNK_SIZE // 100)):
+        valid = []
+        for number, record in chunk:
+            if isinstance(record, Exception):
+                report.error(number, str(record))
+                continue
+            try:
+                test = CareerTestCreateSchema.model_validate(record)
+            except ValidationError as e:
+                report.error(number, _validation_message(e))
+                continue
+            if test.name in seen_names:
+                report.error(number, "Test name repeated in the file")
+                continue
+            seen_names.add(test.name)
+            valid.append((number, test))
+
+        names = [t.name for _, t in valid]
+        existing = set(db.execute(select(CareerTest.name).where(CareerTest.name.in_(names))).scalars()) if names else set()
+        for number, test in valid:
+            if test.name in existing:
+                report.error(number, "A test with this name already exists")
+                continue
+            new_test = CareerTest(
+                name=test.name,
+                description=test.description,
+                last_updated=datetime.utcnow()
+            )
+            db.add(new_test)
+            db.flush()
+            bulk_insert_questions(db, new_test.id, test.questions)
+            report.inserted += 1
+        db.commit()
+
+    return report.as_dict()
+
+
+
+
+
+# Exports walk the table by id in batches (keyset), so memory stays flat however big it is.
+# They take a session factory because they run while the response streams, after the request's session is gone.
+def _csv_line(values) -> str:
+    out = io.StringIO()
+    csv.writer(out).writerow(values)
+    return out.getvalue()
+
+def export_students(session_factory, fmt: str) -> Iterator[str]:
+    columns = [getattr(Student, f) for f in STUDENT_EXPORT_FIELDS]
+    db = session_factory()
+    try:
+        if fmt == "csv":
+            yield _csv_line(STUDENT_EXPORT_FIELDS)
+        last_id = 0
+        while True:
+            rows = db.execute(select(*columns).where(Student.id > last_id).order_by(Student.id).limit(EXPORT_BATCH_SIZE)).all()
+            if not rows:
+                break
+            if fmt == "csv":
+                yield "".join(_csv_line(r) for r in rows)
+            else:
+                yield "".join(json.dumps(r._asdict()) + "\n" for r in rows)
+            last_id = rows[-1].id
+    finally:
+        db.close()
+
+
+def export_tests(session_factory, fmt: str) -> Iterator[str]:
+    db = session_factory()
+    try:
+        if fmt == "csv":
+            yield _csv_line(TEST_CSV_FIELDS)
+        last_id = 0
+        while True:
+            tests = db.execute(
+                select(CareerTest).options(selectinload(CareerTest.questions))
+                .where(CareerTest.id > last_id).order_by(CareerTest.id).limit(EXPORT_BATCH_SIZE // 10)
+            ).scalars().all()
+            if not tests:
+                break
+            for test in tests:
+                if fmt == "csv":
+                    yield "".join(_csv_line([test.name, test.description, q.description, q.tag]) for q in test.questions)
+                else:
+                    yield json.dumps({
+                        "name": test.name,
+                        "description": test.description,
+                        "number_of_questions": test.number_of_questions,
+                        "questions": [{"description": q.description, "tag": q.tag} for q in test.questions],
+                    }) + "\n"
+            last_id = tests[-1].id
+            db.expunge_all()        # drop the batch from the identity map
+    finally:
+        db.close()
@@ -0,0 +1,125 @@
+# uploads.py - One upload pipeline for career page thumbnails: chunked, size-capped, content addressed
+import os, re, hashlib, tempfile, mimetypes
+from fastapi import HTTPException, UploadFile
+from fastapi.responses import JSONResponse
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploads")     # mounted at /uploads in main.py
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(10 * 1024 * 1024)))
+CHUNK_SIZE = 1024 * 1024
+
+os.makedirs(UPLOAD_DIR, exist_ok=True)
+
+
+def _extension(filename: str) -> str:
+    ext = os.path.splitext(filename or "")[1].lower()
+    return ext if re.fullmatch(r"\.[a-z0-9]{1,8}", ext) else ""
+
+
+def save_upload(upload: UploadFile) -> str:
+    """Copy the upload to UPLOAD_DIR in chunks and return its URL. Blocking - call from a worker thread.
+
+    The file is named after the sha256 of its bytes, so two different images never overwrite each other
+    and uploading the same image twice stores it once."""
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=UPLOAD_DIR, prefix=".upload-")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while chunk := upload.file.read(CHUNK_SIZE):
+                size += len(chunk)
+                if size > MAX_UPLOAD_BYTES:
+                    raise _too_large()
+                digest.update(chunk)
+                out.write(chunk)
+
+        filename = digest.hexdigest()[:32] + _extension(upload.filename)
+        final_path = os.path.join(UPLOAD_DIR, filename)
+        if os.path.exists(final_path):
+            os.remove(tmp_path)                 # same content already stored
+        else:
+            os.replace(tmp_path, final_path)    # atomic, readers never see a half written file
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return f"/uploads/{filename}"
+
+
+def delete_upload(url: str):
+    path = os.path.join(UPLOAD_DIR, os.path.basename(url))
+    if url.startswith("/uploads/") and os.path.isfile(path):
+        os.remove(path)
+
+
+# Starlette spools the whole multipart body to disk before the route (and save_upload) sees it, so the
+# size cap is also enforced on the raw request: a Content-Length over the limit is refused before
+# anything is read, and a body without one (chunked) is cut off once it passes the limit.
+MAX_UPLOAD_REQUEST_BYTES = MAX_UPLOAD_BYTES + int(os.getenv("MAX_UPLOAD_FORM_BYTES", str(2 * 1024 * 1024)))   # + title, content...
+UPLOAD_PATHS = re.compile(r"/career-pages/(upload|[^/]+/update)")
+
+def _too_large() -> HTTPException:
+    return HTTPException(status_code=413, detail=f"File is larger than {MAX_UPLOAD_BYTES // (1024 * 1024)} MB")
+
+class UploadSizeLimit:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not UPLOAD_PATHS.fullmatch(scope["path"]):
+            return await self.app(scope, receive, send)
+
+        length = Headers(scope=scope).get("content-length", "")
+        if length.isdigit() and int(length) > MAX_UPLOAD_REQUEST_BYTES:
+            response = JSONResponse({"detail": _too_large().detail}, status_code=413, headers={"Connection": "close"})
+            return await response(scope, receive, send)
+
+        received = 0
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            received += len(message.get("body", b""))
+            if received > MAX_UPLOAD_REQUEST_BYTES:
+                raise _too_large()      # raised inside form parsing, answered by the app's exception handler
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+def add_upload_limit(app):
+    app.add_middleware(UploadSizeLimit)
+
+
+# Serving. Content addressed names (<sha256>.png, <sha256>-320.webp) never change content, so browsers
+# and CDNs may keep them forever; anything else (older uploads like PLANE.png) is cached for an hour.
+CONTENT_ADDRESSED = re.compile(r"[0-9a-f]{32}(-\d+)?\.[a-z0-9]+")
+PRECOMPRESSED = (("br", "br"), ("gzip", "gz"))      # (Content-Encoding, sibling file suffix)
+
+def cache_control_for(filename: str) -> str:
+    if CONTENT_ADDRESSED.fullmatch(os.path.basename(filename)):
+        return "public, max-age=31536000, immutable"
+    return "public, max-age=3600"
+
+
+class UploadFiles(StaticFiles):
+    """StaticFiles for /uploads with cache headers and precompressed siblings (file.svg.br / file.svg.gz).
+    Starlette's FileResponse already streams with sendfile where the server supports it and answers Range requests."""
+
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        accepted = {
+            part.split(";")[0].strip().lower()
+            for part in Headers(scope=scope).get("accept-encoding", "").split(",")
+        }
+        for encoding, suffix in PRECOMPRESSED:
+            compressed_path = f"{full_path}.{suffix}"
+            if encoding in accepted and os.path.isfile(compressed_path):
+                response = super().file_response(compressed_path, os.stat(compressed_path), scope, status_code)
+                response.headers["content-type"] = mimetypes.guess_type(str(full_path))[0] or "application/octet-stream"
+                response.headers["content-encoding"] = encoding
+                break
+        else:
+            response = super().file_response(full_path, stat_result, scope, status_code)
+
+        response.headers["cache-control"] = cache_control_for(str(full_path))
+        response.headers["vary"] = "Accept-Encoding"
+        return response